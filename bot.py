@@ -3,7 +3,7 @@
 
 import os
 from plugins.config import Config
-from pyrogram import Client
+from pyrogram import Client, idle
 
 if __name__ == "__main__":
 
@@ -34,5 +34,19 @@ if __name__ == "__main__":
         plugins=plugins
     )
 
-    print("🎊 I AM ALIVE 🎊  • Support @NT_BOTS_SUPPORT")
-    Client.run()
+    async def main():
+        from plugins.functions.janitor import janitor
+        from plugins.database.database import db
+        from plugins.broadcast import resume_broadcasts
+        from plugins.functions.http_client import http
+        await Client.start()
+        await db.ensure_indexes()
+        # Background services that need the running loop
+        janitor.start()
+        await resume_broadcasts(Client)
+        print("🎊 I AM ALIVE 🎊  • Support @NT_BOTS_SUPPORT")
+        await idle()
+        await Client.stop()
+        await http.close()
+
+    Client.run(main())
@@ -3,108 +3,104 @@
 
 
 
-import traceback, datetime, asyncio, string, random, time, os, aiofiles, aiofiles.os
+import datetime, asyncio, string, random, time, os, aiofiles, aiofiles.os
 from pyrogram import filters
 from pyrogram import Client
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
 from plugins.database.database import db
+from plugins.database.broadcasts import broadcast_store
 from plugins.config import Config
+from plugins.functions.broadcaster import Broadcast
+from plugins.functions.display_progress import TimeFormatter
 broadcast_ids = {}
+# Resumed broadcasts run detached; keep them referenced until they finish
+resumed_tasks = set()
 
-async def send_msg(user_id, message):
+
+async def run_broadcast(c, broadcast, reply_chat_id, reply_id):
+    """Send, then report to the owner; the checkpoint goes away once finished."""
+    log_path = f'broadcast_{broadcast.id}.txt'
+    broadcast_ids[broadcast.id] = broadcast
     try:
-        await message.copy(chat_id=user_id)
-        return 200, None
-    except FloodWait as e:
-        await asyncio.sleep(e.x)
-        return send_msg(user_id, message)
-    except InputUserDeactivated:
-        return 400, f"{user_id} : deactivated\n"
-    except UserIsBlocked:
-        return 400, f"{user_id} : blocked the bot\n"
-    except PeerIdInvalid:
-        return 400, f"{user_id} : user id invalid\n"
-    except Exception as e:
-        return 500, f"{user_id} : {traceback.format_exc()}\n"
-        
+        # Append: a resumed broadcast keeps the failures logged before the restart
+        async with aiofiles.open(log_path, 'a') as broadcast_log_file:
+            broadcast.log_file = broadcast_log_file
+            await broadcast.run(db.iter_user_ids(after=broadcast.last_id, batch_size=Config.BROADCAST_BATCH))
+    finally:
+        broadcast_ids.pop(broadcast.id, None)
+    await broadcast_store.finish(broadcast)
+
+    total_users, done, success, failed = broadcast.total, broadcast.done, broadcast.success, broadcast.failed
+    completed_in = datetime.timedelta(seconds=int(time.time()-broadcast.created))
+    text = f"broadcast completed in `{completed_in}`\n\nTotal users {total_users}.\nTotal done {done}, {success} success and {failed} failed."
+    if failed == 0:
+        await c.send_message(reply_chat_id, text, reply_to_message_id=reply_id)
+    else:
+        await c.send_document(reply_chat_id, log_path, caption=text, reply_to_message_id=reply_id)
+    
+    await aiofiles.os.remove(log_path)
+
+
+async def resume_broadcasts(c):
+    """Start every broadcast a restart interrupted, from its last checkpoint."""
+    async for doc in broadcast_store.unfinished():
+        try:
+            message = await c.get_messages(doc['from_chat_id'], doc['message_id'])
+        except Exception as e:
+            Config.LOGGER.getLogger(__name__).warning(f"Broadcast {doc['_id']} message is gone: {e}")
+            await broadcast_store.col.delete_one({'_id': doc['_id']})
+            continue
+        broadcast = Broadcast(doc['_id'], message, doc['total'], checkpoint=broadcast_store.checkpoint, resume=doc)
+        task = asyncio.create_task(run_broadcast(c, broadcast, doc['reply_chat_id'], doc['reply_id']))
+        resumed_tasks.add(task)
+        task.add_done_callback(resumed_tasks.discard)
+        await c.send_message(
+            doc['reply_chat_id'],
+            f"Resuming broadcast `{doc['_id']}` after restart: {doc['done']}/{doc['total']} done.",
+            reply_to_message_id=doc['reply_id']
+        )
+
 
 @Client.on_message(filters.private & filters.command('broadcast') & filters.reply)
 async def broadcast_(c, m):
     if m.from_user.id != Config.OWNER_ID:
         return
-    all_users = await db.get_all_users()
     
     broadcast_msg = m.reply_to_message
     
     while True:
-        broadcast_id = ''.join([random.choice(string.ascii_letters) for i in range(3)])
+        broadcast_id = ''.join([random.choice(string.ascii_letters) for i in range(8)])
         if not broadcast_ids.get(broadcast_id):
             break
     
     out = await m.reply_text(
-        text = f"You will be notified with log file when all the users are notified."
+        text = f"You will be notified with log file when all the users are notified.\nProgress: `/broadcast status`"
     )
-    start_time = time.time()
     total_users = await db.total_users_count()
-    done = 0
-    failed = 0
-    success = 0
-    
-    broadcast_ids[broadcast_id] = dict(
-        total = total_users,
-        current = done,
-        failed = failed,
-        success = success
-    )
     
-    async with aiofiles.open('broadcast.txt', 'w') as broadcast_log_file:
-        async for user in all_users:
-            
-            sts, msg = await send_msg(
-                user_id = int(user['id']),
-                message = broadcast_msg
-            )
-            if msg is not None:
-                await broadcast_log_file.write(msg)
-            
-            if sts == 200:
-                success += 1
-            else:
-                failed += 1
-            
-            if sts == 400:
-                await db.delete_user(user['id'])
-            
-            done += 1
-            if broadcast_ids.get(broadcast_id) is None:
-                break
-            else:
-                broadcast_ids[broadcast_id].update(
-                    dict(
-                        current = done,
-                        failed = failed,
-                        success = success
-                    )
-                )
-    if broadcast_ids.get(broadcast_id):
-        broadcast_ids.pop(broadcast_id)
-    completed_in = datetime.timedelta(seconds=int(time.time()-start_time))
+    broadcast = Broadcast(broadcast_id, broadcast_msg, total_users, checkpoint=broadcast_store.checkpoint)
+    await broadcast_store.create(broadcast, broadcast_msg.chat.id, broadcast_msg.id, m.chat.id, m.id)
+    await run_broadcast(c, broadcast, m.chat.id, m.id)
     
     await asyncio.sleep(5)
     
     await out.delete()
-    
-    if failed == 0:
-        await m.reply_text(
-            text=f"broadcast completed in `{completed_in}`\n\nTotal users {total_users}.\nTotal done {done}, {success} success and {failed} failed.",
-            quote=True
-        )
-    else:
-        await m.reply_document(
-            document='broadcast.txt',
-            caption=f"broadcast completed in `{completed_in}`\n\nTotal users {total_users}.\nTotal done {done}, {success} success and {failed} failed.",
-            quote=True
+
+
+@Client.on_message(filters.private & filters.command('broadcast') & ~filters.reply)
+async def broadcast_status(c, m):
+    if m.from_user.id != Config.OWNER_ID:
+        return
+    if not broadcast_ids:
+        await m.reply_text("No broadcast is running.", quote=True)
+        return
+    lines = []
+    for broadcast_id, broadcast in broadcast_ids.items():
+        st = broadcast.stats()
+        eta = TimeFormatter(st['eta'] * 1000) if st['eta'] else "?"
+        lines.append(
+            f"**{broadcast_id}:** {st['done']}/{st['total']} done, {st['success']} success, "
+            f"{st['failed']} failed ({st['removed']} removed)\n"
+            f"Speed: {st['speed']:.1f} msg/s (limit {st['rate']:.0f}/s), ETA: {eta}"
         )
-    
-    await aiofiles.os.remove('broadcast.txt')
+    await m.reply_text("\n\n".join(lines), quote=True)
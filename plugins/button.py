@@ -2,16 +2,22 @@
 # Native impersonate PRIMARY + extractor_args FALLBACK
 # FIXED upload logic (was inverted)
 
-import logging, asyncio, json, os, shutil, time, re
-from datetime import datetime
-from pyrogram import enums
+import logging, asyncio, os, shutil, time
 from plugins.config import Config
 from plugins.script import Translation
 from plugins.thumbnail import *
-from plugins.functions.display_progress import progress_for_pyrogram, humanbytes
+from plugins.functions.display_progress import progress_for_pyrogram, cancel_markup, humanbytes, TimeFormatter
 from plugins.database.database import db
+from plugins.database.file_cache import file_cache
 from plugins.functions.ran_text import random_char
-from plugins.functions.impersonate import impersonate_final_url
+from plugins.functions.redirects import redirects
+from plugins.functions.ytdl_pool import download_pool
+from plugins.functions.scheduler import scheduler
+from plugins.functions.stream_upload import StreamUpload, send_streamed
+from plugins.functions.sessions import sessions
+from plugins.functions.edits import edits
+from plugins.functions.disk import disk, announced_size, DiskFullError
+from plugins.functions.help_Nekmo_ffmpeg import generate_screen_shots, send_screen_shots
 
 logger = logging.getLogger(__name__)
 cookies_file = 'cookies.txt' if os.path.exists('cookies.txt') else None
@@ -34,6 +40,20 @@ def sanitize_filename(name):
 def aria2c_available():
     return shutil.which("aria2c") is not None
 
+def download_progress(update, custom_name, job, label=""):
+    """Caption updates fed by the job's ProgressEvents, sent through the edit coalescer."""
+    markup = cancel_markup(job)
+
+    def on_progress(event):
+        if event.status != "downloading":
+            return
+        percent = f"{event.percent:.1f}" if event.percent is not None else "?"
+        speed = f"{humanbytes(event.speed)}/s" if event.speed else "Unknown"
+        eta = TimeFormatter(event.eta * 1000) if event.eta else "?"
+        edits.submit(update.message, f"⬇️ {custom_name}\n{label}Progress: {percent}%\nSpeed: {speed}\nETA: {eta}", reply_markup=markup)
+
+    return on_progress
+
 
 async def youtube_dl_call_back(bot, update):
 
@@ -52,15 +72,57 @@ async def youtube_dl_call_back(bot, update):
         await update.message.edit_caption("❌ Invalid request.")
         return
 
-    sess_file = os.path.join(Config.DOWNLOAD_LOCATION, f"{update.from_user.id}{sid}.json")
-    if not os.path.exists(sess_file):
+    info = await sessions.get(update.from_user.id, sid)
+    if info is None:
         await update.message.edit_caption("❌ Session expired. Send link again.")
         return
 
-    info = json.load(open(sess_file))
+    # Already uploaded once? Re-send the Telegram file instead
+    text = update.message.reply_to_message.text.strip()
+    if "|" not in text:
+        mode = "video" if await db.get_upload_as_doc(update.from_user.id) else "document"
+        cached = await file_cache.get(text, fmt, mode)
+        if cached:
+            try:
+                await bot.send_cached_media(
+                    chat_id=update.message.chat.id,
+                    file_id=cached["file_id"],
+                    caption=cached.get("caption") or "",
+                    reply_to_message_id=update.message.id
+                )
+                await update.message.edit_caption("✅ Uploaded successfully.")
+                await sessions.drop(update.from_user.id, sid)
+                return
+            except Exception as e:
+                logger.warning(f"Cached file_id failed, uploading again: {e}")
+                await file_cache.invalidate(text, fmt, mode)
+
+    # Download + upload run in the scheduler; the handler returns right away.
+    # A job with a known size only starts once the disk can hold it.
+    size = announced_size(info, fmt)
+    try:
+        job = scheduler.submit(
+            update.from_user.id,
+            lambda job: youtube_dl_job(job, bot, update, fmt, ext, sid, info),
+            name=f"ytdl {fmt}",
+            size=size
+        )
+    except DiskFullError:
+        await update.message.edit_caption(f"❌ Not enough disk space for this file ({humanbytes(size)}).")
+        await sessions.drop(update.from_user.id, sid)
+        return
+    position = scheduler.position(job)
+    try:
+        await update.answer(f"⏳ Queued, position {position}" if position else "⬇️ Download started")
+    except:
+        pass
+
+
+async def youtube_dl_job(job, bot, update, fmt, ext, sid, info):
 
     # Parse original URL
     url = update.message.reply_to_message.text.strip()
+    source_url = url
     custom_name = None
 
     if "|" in url:
@@ -72,7 +134,7 @@ async def youtube_dl_call_back(bot, update):
     # Resolve CDN redirects
     if any(x in url.lower() for x in ["get_stream", "getstream", "okcdn", "redirect"]):
         try:
-            url = impersonate_final_url(url)
+            url = await redirects.resolve(url)
             logger.info(f"CDN redirect resolved")
         except:
             pass
@@ -84,78 +146,84 @@ async def youtube_dl_call_back(bot, update):
 
     tmp = os.path.join(Config.DOWNLOAD_LOCATION, f"{update.from_user.id}{random_char(5)}")
     os.makedirs(tmp, exist_ok=True)
+    disk.track(job.id, tmp)
     output = os.path.join(tmp, custom_name)
 
+    # Progressive single-file formats with a known size can be uploaded
+    # while they download; merged/post-processed formats use the normal flow
+    chosen = next((f for f in info.get("formats", []) if f.get("format_id") == fmt), None)
+    stream = None
+    if Config.STREAM_UPLOAD and chosen and chosen.get("filesize") \
+            and chosen.get("vcodec") not in (None, "none") and chosen.get("acodec") not in (None, "none") \
+            and chosen.get("protocol") in ("http", "https"):
+        stream = StreamUpload(
+            bot,
+            output,
+            progress=progress_for_pyrogram,
+            progress_args=(Translation.UPLOAD_START, update.message, time.time(), job),
+            slot=lambda: scheduler.stream_slot(job)
+        )
+
     # 🔥 PRIMARY: Native impersonate
-    cmd = [
-        "yt-dlp",
+    args = [
         "--impersonate", "chrome",
         "-c",
         "--max-filesize", str(Config.TG_MAX_FILE_SIZE),
-        "-o", output,
-        "--embed-subs",
-        "--hls-prefer-ffmpeg",
-        "-f", f"{fmt}+bestaudio/best"
+        "-o", output
     ]
 
     if cookies_file:
-        cmd += ["--cookies", cookies_file]
-
-    if aria2c_available():
-        cmd += [
-            "--external-downloader", "aria2c",
-            "--external-downloader-args", "-x 16 -s 16 -k 1M --max-connection-per-server=16 --min-split-size=1M",
-            "--buffer-size", "16K",
-            "--http-chunk-size", "10M",
-            "--retries", "10",
-            "--fragment-retries", "10"
-        ]
+        args += ["--cookies", cookies_file]
+
+    if stream:
+        # Sequential writes only, nothing to merge or embed afterwards; fixups
+        # would rewrite the file after its parts were already sent
+        args += ["-f", fmt, "--http-chunk-size", "10M", "--retries", "10", "--fixup", "never", "--no-post-overwrites"]
     else:
-        cmd += ["-N", "8", "--retries", "5"]
+        args += ["--embed-subs", "--hls-prefer-ffmpeg", "-f", f"{fmt}+bestaudio/best"]
+        if aria2c_available():
+            args += [
+                "--external-downloader", "aria2c",
+                "--external-downloader-args", "-x 16 -s 16 -k 1M --max-connection-per-server=16 --min-split-size=1M",
+                "--buffer-size", "16K",
+                "--http-chunk-size", "10M",
+                "--retries", "10",
+                "--fragment-retries", "10"
+            ]
+        else:
+            args += ["-N", "8", "--retries", "5"]
 
     if Config.HTTP_PROXY:
-        cmd += ["--proxy", Config.HTTP_PROXY]
-
-    cmd.append(url)
+        args += ["--proxy", Config.HTTP_PROXY]
 
     await update.message.edit_caption(Translation.DOWNLOAD_START.format(custom_name))
-    logger.info(f"🔥 PRIMARY: {' '.join(cmd)}")
-
-    # Run download
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-
-    last_update = time.time()
-    while True:
-        line = await proc.stdout.readline()
-        if not line:
-            break
-        text = line.decode().strip()
-
-        m = re.search(r"(\d+\.\d+)%.*?at\s+([\d\.]+\w+/s)?", text)
-        if m and time.time() - last_update > 3:
-            percent = m.group(1)
-            speed = m.group(2) or "Unknown"
-            try:
-                await update.message.edit_caption(
-                    f"⬇️ {custom_name}\nProgress: {percent}%\nSpeed: {speed}"
-                )
-                last_update = time.time()
-            except:
-                pass
+    logger.info(f"🔥 PRIMARY: {' '.join(args)} {url}")
+
+    if stream:
+        stream.start(chosen["filesize"])
 
-    await proc.wait()
-    rc = proc.returncode
+    error = None
+    try:
+        result = await download_pool.download(args, url, progress=download_progress(update, custom_name, job), job_id=job.id)
+        output = result.get("filepath") or output
+    except Exception as e:
+        error = e
+    except asyncio.CancelledError:
+        if stream:
+            stream.abort()
+        raise
+    finally:
+        if stream:
+            stream.download_finished()
 
     # 🔄 FALLBACK if native failed
-    if rc != 0:
-        logger.warning(f"⚠️ Native failed (code {rc}), trying FALLBACK...")
-        
-        cmd_fallback = [
-            "yt-dlp",
+    if error is not None:
+        if stream:
+            stream.abort()
+            stream = None
+        logger.warning(f"⚠️ Native failed ({error}), trying FALLBACK...")
+
+        args_fallback = [
             "--extractor-args", "generic:impersonate=chrome",
             "-c",
             "--max-filesize", str(Config.TG_MAX_FILE_SIZE),
@@ -166,53 +234,33 @@ async def youtube_dl_call_back(bot, update):
         ]
 
         if cookies_file:
-            cmd_fallback += ["--cookies", cookies_file]
+            args_fallback += ["--cookies", cookies_file]
 
         if aria2c_available():
-            cmd_fallback += [
+            args_fallback += [
                 "--external-downloader", "aria2c",
                 "--external-downloader-args", "-x 16 -s 16 -k 1M --max-connection-per-server=16 --min-split-size=1M"
             ]
         else:
-            cmd_fallback += ["-N", "8", "--retries", "5"]
+            args_fallback += ["-N", "8", "--retries", "5"]
 
         if Config.HTTP_PROXY:
-            cmd_fallback += ["--proxy", Config.HTTP_PROXY]
+            args_fallback += ["--proxy", Config.HTTP_PROXY]
 
-        cmd_fallback.append(url)
+        logger.info(f"🔄 FALLBACK: {' '.join(args_fallback)} {url}")
 
-        logger.info(f"🔄 FALLBACK: {' '.join(cmd_fallback)}")
+        error = None
+        try:
+            result = await download_pool.download(args_fallback, url, progress=download_progress(update, custom_name, job, "🔄 Fallback\n"), job_id=job.id)
+            output = result.get("filepath") or output
+        except Exception as e:
+            error = e
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd_fallback,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+    # Progress edits still queued would overwrite the status below
+    await edits.forget(update.message)
 
-        last_update = time.time()
-        while True:
-            line = await proc.stdout.readline()
-            if not line:
-                break
-            text = line.decode().strip()
-
-            m = re.search(r"(\d+\.\d+)%.*?at\s+([\d\.]+\w+/s)?", text)
-            if m and time.time() - last_update > 3:
-                percent = m.group(1)
-                speed = m.group(2) or "Unknown"
-                try:
-                    await update.message.edit_caption(
-                        f"⬇️ {custom_name}\n🔄 Fallback\nProgress: {percent}%\nSpeed: {speed}"
-                    )
-                    last_update = time.time()
-                except:
-                    pass
-
-        await proc.wait()
-        rc = proc.returncode
-
-    if rc != 0:
-        await update.message.edit_caption(f"❌ Download failed (code {rc})")
+    if error is not None:
+        await update.message.edit_caption(f"❌ Download failed: {error}"[:1024])
         shutil.rmtree(tmp, ignore_errors=True)
         return
 
@@ -238,46 +286,89 @@ async def youtube_dl_call_back(bot, update):
         shutil.rmtree(tmp, ignore_errors=True)
         return
 
-    await update.message.edit_caption(Translation.UPLOAD_START.format(custom_name))
-    start_up = time.time()
+    input_file = await stream.result() if stream else None
+    job.check()
 
-    # 🔧 FIXED: Corrected upload logic
-    try:
-        # Check user preference (True = upload as video, False = upload as document)
-        upload_as_video = await db.get_upload_as_doc(update.from_user.id)
-        
-        if upload_as_video:
-            # Upload as VIDEO with streaming
-            w, h, d = await Mdata01(output)
-            thumb = await Gthumb02(bot, update, d, output)
-            await update.message.reply_video(
-                output,
-                width=w,
-                height=h,
-                duration=d,
-                supports_streaming=True,
-                thumb=thumb,
-                caption=title[:1024],
-                progress=progress_for_pyrogram,
-                progress_args=(Translation.UPLOAD_START, update.message, start_up)
-            )
-        else:
-            # Upload as DOCUMENT
-            thumb = await Gthumb01(bot, update)
-            await update.message.reply_document(
-                output,
-                thumb=thumb,
-                caption=title[:1024],
-                progress=progress_for_pyrogram,
-                progress_args=(Translation.UPLOAD_START, update.message, start_up)
-            )
+    async with scheduler.upload_slot(job):
+        await update.message.edit_caption(Translation.UPLOAD_START.format(custom_name))
+        start_up = time.time()
 
-    except Exception as e:
-        await update.message.edit_caption(f"❌ Upload failed: {e}")
-        shutil.rmtree(tmp, ignore_errors=True)
-        return
+        # 🔧 FIXED: Corrected upload logic
+        try:
+            # Check user preference (True = upload as video, False = upload as document)
+            upload_as_video = await db.get_upload_as_doc(update.from_user.id)
+
+            if input_file is not None:
+                # Parts were already uploaded while downloading
+                thumb = await Gthumb01(bot, update)
+                sent = await send_streamed(
+                    bot,
+                    update.message,
+                    input_file,
+                    os.path.basename(output),
+                    caption=title[:1024],
+                    thumb=thumb,
+                    video=(int(info.get("duration") or 0), chosen.get("width"), chosen.get("height")) if upload_as_video else None
+                )
+            elif upload_as_video:
+                # Upload as VIDEO with streaming
+                known = dict(duration=info.get("duration"))
+                if chosen:
+                    known.update(width=chosen.get("width"), height=chosen.get("height"))
+                w, h, d = await Mdata01(output, known)
+                thumb = await Gthumb02(bot, update, d, output)
+                sent = await update.message.reply_video(
+                    output,
+                    width=w,
+                    height=h,
+                    duration=d,
+                    supports_streaming=True,
+                    thumb=thumb,
+                    caption=title[:1024],
+                    progress=progress_for_pyrogram,
+                    progress_args=(Translation.UPLOAD_START, update.message, start_up, job)
+                )
+            else:
+                # Upload as DOCUMENT
+                thumb = await Gthumb01(bot, update)
+                sent = await update.message.reply_document(
+                    output,
+                    thumb=thumb,
+                    caption=title[:1024],
+                    progress=progress_for_pyrogram,
+                    progress_args=(Translation.UPLOAD_START, update.message, start_up, job)
+                )
+
+        except Exception as e:
+            await edits.forget(update.message)
+            await update.message.edit_caption(f"❌ Upload failed: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        # A stopped transmission returns None instead of raising
+        job.check()
+
+    # Renamed uploads are one-offs; everything else can be re-sent later
+    media = sent and (sent.video or sent.document)
+    if media and "|" not in source_url:
+        try:
+            await file_cache.put(source_url, fmt, "video" if upload_as_video else "document", media, caption=title[:1024])
+        except Exception as e:
+            logger.warning(f"file_id cache store failed: {e}")
+
+    if sent and upload_as_video and Config.SCREENSHOTS > 0:
+        try:
+            # At least a second of video per screenshot
+            images = await generate_screen_shots(
+                output, tmp, False, None, Config.SCREENSHOTS, Config.SCREENSHOTS,
+                duration=int(info.get("duration") or 0) or None
+            )
+            if images:
+                await send_screen_shots(bot, update.message.chat.id, images, reply_to_message_id=sent.id)
+        except Exception as e:
+            logger.warning(f"Screenshots failed: {e}")
 
     shutil.rmtree(tmp, ignore_errors=True)
-    os.remove(sess_file)
+    await sessions.drop(update.from_user.id, sid)
 
+    await edits.forget(update.message)
     await update.message.edit_caption("✅ Uploaded successfully.")
@@ -8,6 +8,7 @@ from plugins.script import Translation
 from pyrogram import Client, types
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from plugins.database.database import db
+from plugins.functions.forcesub import fsub_cache, MEMBER, BANNED
 import logging
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -34,34 +35,29 @@ async def button(bot, update):
         )
     elif "refreshForceSub" in update.data:
         if Config.UPDATES_CHANNEL:
-            if str(Config.UPDATES_CHANNEL).startswith("-100"):
-                channel_chat_id = int(Config.UPDATES_CHANNEL)
-            else:
-                channel_chat_id = Config.UPDATES_CHANNEL
             try:
-                user = await bot.get_chat_member(channel_chat_id, update.message.chat.id)
-                if user.status == "kicked":
+                status = await fsub_cache.membership(bot, update.from_user.id)
+                if status == BANNED:
                     await update.message.edit(
                         text="Sorry Sir, You are Banned. Contact My [Support Group](https://t.me/NT_BOTS_SUPPORT)",
                         disable_web_page_preview=True
                     )
                     return
-            except UserNotParticipant:
-                chat_id = channel_chat_id
-                await update.message.edit(
-                    text="**I like Your Smartness But Don't Be Oversmart! 😑**\n\n",
-                    reply_markup=InlineKeyboardMarkup(
-                        [
-                            [
-                                InlineKeyboardButton("🤖 Join Updates Channel", url=invite_link.invite_link)
-                            ],
+                if status != MEMBER:
+                    await update.message.edit(
+                        text="**I like Your Smartness But Don't Be Oversmart! 😑**\n\n",
+                        reply_markup=InlineKeyboardMarkup(
                             [
-                                InlineKeyboardButton("🔄 Refresh 🔄", callback_data="refreshForceSub")
+                                [
+                                    InlineKeyboardButton("🤖 Join Updates Channel", url=await fsub_cache.invite_link(bot))
+                                ],
+                                [
+                                    InlineKeyboardButton("🔄 Refresh 🔄", callback_data="refreshForceSub")
+                                ]
                             ]
-                        ]
+                        )
                     )
-                )
-                return
+                    return
             except Exception:
                 await update.message.edit(
                     text="Something Went Wrong. Contact My [Support Group](https://t.me/NT_BOTS_SUPPORT)",
@@ -21,6 +21,8 @@ from plugins.settings.settings import OpenSettings
 from plugins.config import *
 from plugins.functions.verify import verify_user, check_token
 from pyrogram import types, errors
+from plugins.functions.scheduler import scheduler
+from plugins.functions.edits import edits
 
 
 
@@ -110,15 +112,30 @@ async def add_caption_help(bot, update):
     )
 
 
-@Client.on_callback_query(filters.regex('^cancel_download\+'))
+# Runs ahead of the catch-all router in callbacks.py, which would delete the message
+@Client.on_callback_query(filters.regex(r'^cancel_download\+'), group=-1)
 async def cancel_cb(c, m):
-    await m.answer()
-    await m.message.edit(text="Trying to Cancel")
-    id = m.data.split("+", 1)[1]
-    if id not in Config.DOWNLOAD_LOCATION:
-        await m.message.edit("This process already cancelled reason may be bot restarted")
-        return
-    Config.DOWNLOAD_LOCATION.remove(id)
+    try:
+        job_id = m.data.split("+", 1)[1]
+        job = scheduler.get(job_id)
+        if job is None:
+            await m.answer("This process already finished or was cancelled, reason may be bot restarted", show_alert=True)
+            return
+        if m.from_user.id not in (job.user_id, Config.OWNER_ID):
+            await m.answer("This is not your process", show_alert=True)
+            return
+        scheduler.cancel(job_id)
+        await m.answer("Cancelled")
+        await edits.forget(m.message)
+        try:
+            if m.message.media:
+                await m.message.edit_caption("⛔ Cancelled")
+            else:
+                await m.message.edit_text("⛔ Cancelled")
+        except errors.RPCError:
+            pass
+    finally:
+        m.stop_propagation()
 
 
 @Client.on_message(filters.private & filters.command("info", [".", "/"]))
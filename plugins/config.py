@@ -19,7 +19,7 @@ class Config(object):
     MAX_FILE_SIZE = 2194304000
     TG_MAX_FILE_SIZE = 2194304000
     FREE_USER_MAX_FILE_SIZE = 2194304000
-    CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 128))
+    CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 256 * 1024))
     DEF_THUMB_NAIL_VID_S = os.environ.get("DEF_THUMB_NAIL_VID_S", "https://placehold.it/90x90")
     HTTP_PROXY = os.environ.get("HTTP_PROXY", "")
     
@@ -37,6 +37,10 @@ class Config(object):
     OWNER_ID = int(os.environ.get("OWNER_ID", ""))
     SESSION_NAME = "UploaderXNTBot"
     UPDATES_CHANNEL = os.environ.get("UPDATES_CHANNEL", "")
+    # Subscribed users skip the membership check for this many seconds
+    FSUB_MEMBER_TTL = int(os.environ.get("FSUB_MEMBER_TTL", 300))
+    # The channel invite link is recreated this often
+    FSUB_LINK_TTL = int(os.environ.get("FSUB_LINK_TTL", 6 * 60 * 60))
 
     TG_MIN_FILE_SIZE = 2194304000
     BOT_USERNAME = os.environ.get("BOT_USERNAME", "")
@@ -48,8 +52,90 @@ class Config(object):
     # Shortlink settings
     SHORT_DOMAIN = environ.get("SHORT_DOMAIN", "")
     SHORT_API = environ.get("SHORT_API", "")
+    # Shortened verify links are reused for this many seconds
+    SHORTLINK_CACHE_TTL = int(os.environ.get("SHORTLINK_CACHE_TTL", 600))
+
+    # Shared HTTP client for API calls: total and per-host connections, timeout in seconds
+    HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+    HTTP_PER_HOST = int(os.environ.get("HTTP_PER_HOST", 10))
+    HTTP_TIMEOUT = int(os.environ.get("HTTP_TIMEOUT", 15))
+
+    # CDN redirect lookups: seconds before giving up, parallel curls, seconds a final URL is reused
+    REDIRECT_TIMEOUT = int(os.environ.get("REDIRECT_TIMEOUT", 15))
+    REDIRECT_CONCURRENCY = int(os.environ.get("REDIRECT_CONCURRENCY", 4))
+    REDIRECT_CACHE_TTL = int(os.environ.get("REDIRECT_CACHE_TTL", 600))
 
     # Verification video link
     VERIFICATION = os.environ.get("VERIFICATION", "")
+    # Unused verify links expire after this many seconds
+    VERIFY_TOKEN_TTL = int(os.environ.get("VERIFY_TOKEN_TTL", 24 * 60 * 60))
+
+    # Extraction cache (EXTRACT_CACHE_DIR empty = memory only)
+    EXTRACT_CACHE_SIZE = int(os.environ.get("EXTRACT_CACHE_SIZE", 256))
+    EXTRACT_CACHE_TTL = int(os.environ.get("EXTRACT_CACHE_TTL", 3 * 60 * 60))
+    EXTRACT_CACHE_DIR = os.environ.get("EXTRACT_CACHE_DIR", "")
+
+    # yt-dlp worker pools (workers restart after YTDL_WORKER_MAX_JOBS jobs, 0 = never).
+    # YTDL_POOL_SIZE workers only extract, so new links never wait behind downloads.
+    YTDL_POOL_SIZE = int(os.environ.get("YTDL_POOL_SIZE", 2))
+    YTDL_WORKER_MAX_JOBS = int(os.environ.get("YTDL_WORKER_MAX_JOBS", 50))
+
+    # Job scheduler stage limits
+    MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", 3))
+    # Download workers; one per download slot unless set
+    YTDL_DOWNLOAD_WORKERS = int(os.environ.get("YTDL_DOWNLOAD_WORKERS", MAX_CONCURRENT_DOWNLOADS))
+    MAX_CONCURRENT_UPLOADS = int(os.environ.get("MAX_CONCURRENT_UPLOADS", 2))
+
+    # Upload progressive formats / direct links while they are still downloading
+    STREAM_UPLOAD = os.environ.get("STREAM_UPLOAD", "").lower() == "true"
+
+    # Uploaded file_id cache size (MongoDB documents)
+    FILE_CACHE_MAX = int(os.environ.get("FILE_CACHE_MAX", 50000))
+
+    # Hedged extraction: start the fallback after HEDGE_DELAY seconds,
+    # or immediately for HEDGE_DOMAINS (space separated)
+    HEDGE_DELAY = float(os.environ.get("HEDGE_DELAY", 4))
+    HEDGE_DOMAINS = set(os.environ.get("HEDGE_DOMAINS", "").split())
+
+    # Format-selection sessions (persisted compressed under DOWNLOAD_LOCATION/sessions)
+    SESSION_TTL = int(os.environ.get("SESSION_TTL", 60 * 60))
+    SESSION_PERSIST = os.environ.get("SESSION_PERSIST", "").lower() == "true"
+
+    # Progress edits: at most one per message every EDIT_INTERVAL seconds,
+    # EDITS_PER_SECOND across all messages
+    EDIT_INTERVAL = float(os.environ.get("EDIT_INTERVAL", 5))
+    EDITS_PER_SECOND = float(os.environ.get("EDITS_PER_SECOND", 10))
+
+    # Direct link downloads: ranged connections per file and write buffer size
+    DDL_CONNECTIONS = int(os.environ.get("DDL_CONNECTIONS", 8))
+    DDL_BUFFER_SIZE = int(os.environ.get("DDL_BUFFER_SIZE", 4 * 1024 * 1024))
+
+    # Disk space kept free in DOWNLOAD_LOCATION when admitting jobs
+    DISK_HEADROOM = int(os.environ.get("DISK_HEADROOM", 256 * 1024 * 1024))
+
+    # Per-user settings cache in front of MongoDB
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 10 * 60))
+    KNOWN_USERS_MAX = int(os.environ.get("KNOWN_USERS_MAX", 200000))
+
+    # Broadcast: concurrent senders sharing BROADCAST_RATE messages/second
+    BROADCAST_SENDERS = int(os.environ.get("BROADCAST_SENDERS", 10))
+    BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 25))
+    BROADCAST_BATCH = int(os.environ.get("BROADCAST_BATCH", 500))
+
+    # Janitor for DOWNLOAD_LOCATION (JANITOR_MAX_BYTES 0 = no size quota)
+    JANITOR_INTERVAL = int(os.environ.get("JANITOR_INTERVAL", 10 * 60))
+    JANITOR_MAX_AGE = int(os.environ.get("JANITOR_MAX_AGE", 6 * 60 * 60))
+    JANITOR_MAX_BYTES = int(os.environ.get("JANITOR_MAX_BYTES", 0))
+
+    # Prepared custom thumbnails kept under DOWNLOAD_LOCATION/thumbs
+    THUMB_CACHE_SIZE = int(os.environ.get("THUMB_CACHE_SIZE", 500))
+
+    # Media probing: parallel ffprobe/hachoir runs and files remembered
+    PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", 2))
+    METADATA_CACHE_SIZE = int(os.environ.get("METADATA_CACHE_SIZE", 256))
+
+    # Screenshots sent as an album after each video upload (0 = off)
+    SCREENSHOTS = int(os.environ.get("SCREENSHOTS", 0))
 
     
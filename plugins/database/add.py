@@ -6,6 +6,7 @@ from pyrogram.types import Message
 
 
 async def AddUser(bot: Client, update: Message):
-    if not await db.is_user_exist(update.from_user.id):
-           await db.add_user(update.from_user.id)
+    # Known users cost nothing; everyone else is one idempotent upsert
+    if not db.is_known(update.from_user.id):
+        await db.add_user(update.from_user.id)
 
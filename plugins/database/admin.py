@@ -5,10 +5,20 @@ from pyrogram.types import (
     Message
 )
 from plugins.config import Config
-from pyrogram import Client, enums
+from pyrogram import Client
 from plugins.database.database import db
+from plugins.database.file_cache import file_cache
 from plugins.functions.display_progress import humanbytes
-from pyrogram import Client
+from plugins.functions.extract_cache import extract_cache
+from plugins.functions.ytdl_pool import extract_pool, download_pool
+from plugins.functions.scheduler import scheduler
+from plugins.functions.hedge import hedge_summary
+from plugins.functions.edits import edits
+from plugins.functions.disk import disk
+from plugins.functions.janitor import janitor
+from plugins.functions.forcesub import fsub_cache
+from plugins.functions.redirects import redirects
+from plugins.functions.metadata import metadata
 
 @Client.on_message(filters.private & filters.command('total'))
 async def sts(c, m):
@@ -28,12 +38,56 @@ async def status_handler(_, m: Message):
     ram_usage = psutil.virtual_memory().percent
     disk_usage = psutil.disk_usage('/').percent
     total_users = await db.total_users_count()
+    ec = extract_cache.stats()
+    xp = extract_pool.stats()
+    yp = download_pool.stats()
+    js = scheduler.stats()
+    hedge, fallback_domains = hedge_summary()
+    pe = edits.stats()
+    dk = disk.stats()
+    jn = janitor.stats()
+    uc = db.cache.stats()
+    fs = fsub_cache.stats()
+    rd = redirects.stats()
+    md = metadata.stats()
     await m.reply_text(
         text=f"**Total Disk Space:** {total} \n"
              f"**Used Space:** {used}({disk_usage}%) \n"
              f"**Free Space:** {free} \n"
              f"**CPU Usage:** {cpu_usage}% \n"
              f"**RAM Usage:** {ram_usage}%\n\n"
-             f"**Total Users in DB:** `{total_users}`",
+             f"**Total Users in DB:** `{total_users}`\n\n"
+             f"**User Cache:** {uc['entries']} profiles, {uc['hits']} hits / {uc['misses']} misses "
+             f"({uc['hit_ratio'] * 100:.1f}%)\n"
+             f"**Force-Sub Cache:** {fs['members']} members, {fs['hits']} hits / {fs['misses']} misses "
+             f"({fs['hit_ratio'] * 100:.1f}%)\n"
+             f"**Extract Cache:** {ec['entries']} entries, "
+             f"{ec['hits'] + ec['disk_hits']} hits / {ec['misses']} misses ({ec['hit_ratio'] * 100:.1f}%)\n"
+             f"**yt-dlp Extract Workers:** {xp['busy']}/{xp['workers']} busy, {xp['queued']} queued, "
+             f"{xp['completed']} done, {xp['failed']} failed\n"
+             f"**yt-dlp Download Workers:** {yp['busy']}/{yp['workers']} busy, {yp['queued']} queued, "
+             f"{yp['completed']} done, {yp['failed']} failed\n"
+             f"**Jobs:** {js['downloading']} downloading, {js['uploading']} uploading, {js['streaming']} streaming, "
+             f"{js['queued']} queued ({js['users_waiting']} users)\n"
+             f"**Disk Reservations:** {dk['jobs']} jobs, {humanbytes(dk['outstanding']) or '0 B'} still to write, "
+             f"{humanbytes(dk['available']) or '0 B'} admittable, {dk['rejected']} rejected\n"
+             f"**Janitor:** {humanbytes(jn['reclaimed']) or '0 B'} reclaimed in {jn['removed']} items "
+             f"({humanbytes(jn['last_reclaimed']) or '0 B'} last run)\n"
+             f"**Redirects:** {rd['resolved']} resolved, {rd['hits']} cached, {rd['timeouts']} timed out, "
+             f"p50 {rd['p50'] * 1000:.0f} ms / p95 {rd['p95'] * 1000:.0f} ms\n"
+             f"**Media Probes:** {md['probes']} run, {md['hits']} cached, {md['skipped']} skipped (known from yt-dlp)\n"
+             f"**Progress Edits:** {pe['sent']} sent, {pe['skipped']} coalesced, {pe['pending']} pending\n"
+             f"**Extraction Winners:** native {hedge['primary']}, fallback {hedge['fallback']}, "
+             f"failed {hedge['failed']}\n"
+             f"**Fallback Domains:** {', '.join(f'{d} ({n})' for d, n in fallback_domains) or 'none'}",
         quote=True
     )
+
+
+@Client.on_message(filters.private & filters.command('uncache') & filters.user(Config.OWNER_ID))
+async def uncache_handler(_, m: Message):
+    if len(m.command) < 2:
+        await m.reply_text("Usage: `/uncache <url>`", quote=True)
+        return
+    removed = await file_cache.invalidate(m.command[1])
+    await m.reply_text(f"Removed {removed} cached upload(s).", quote=True)
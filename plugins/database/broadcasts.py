@@ -0,0 +1,44 @@
+# Broadcast checkpoints: one document per unfinished broadcast with the
+# message to copy, the last user _id every sender got past and the counters.
+# Unfinished broadcasts resume from there after a restart.
+
+import time
+from plugins.database.database import db
+
+
+class BroadcastStore:
+    def __init__(self, database):
+        self.col = database.db.broadcasts
+
+    async def create(self, broadcast, from_chat_id, message_id, reply_chat_id, reply_id):
+        await self.col.insert_one(dict(
+            _id=broadcast.id,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            reply_chat_id=reply_chat_id,
+            reply_id=reply_id,
+            total=broadcast.total,
+            created=broadcast.created,
+            **self._progress(broadcast)
+        ))
+
+    @staticmethod
+    def _progress(broadcast):
+        # Counters as of last_id, so a resume does not count in-flight users twice
+        return dict(
+            **broadcast.committed(),
+            removed=broadcast.removed,
+            updated=time.time(),
+        )
+
+    async def checkpoint(self, broadcast):
+        await self.col.update_one({'_id': broadcast.id}, {'$set': self._progress(broadcast)})
+
+    async def finish(self, broadcast):
+        await self.col.delete_one({'_id': broadcast.id})
+
+    def unfinished(self):
+        return self.col.find({})
+
+
+broadcast_store = BroadcastStore(db)
@@ -1,15 +1,116 @@
 # (c) @AbirHasan2005
 
+import time
+import logging
 import datetime
+from collections import OrderedDict
 import motor.motor_asyncio
+from pymongo import DeleteMany
+from pymongo.errors import OperationFailure
 from plugins.config import Config
 
+logger = logging.getLogger(__name__)
+
+# Fields the bot reads per user; loaded together in one find_one
+PROFILE_PROJECTION = {
+    '_id': 0, 'id': 1, 'join_date': 1, 'apply_caption': 1,
+    'upload_as_doc': 1, 'thumbnail': 1, 'caption': 1
+}
+
+
+class UserCache:
+    """LRU of user profiles with a TTL; setters write through it."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id):
+        entry = self._entries.get(id)
+        if entry is None or entry[0] <= time.time():
+            self._entries.pop(id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, id, profile):
+        self._entries[id] = (time.time() + self.ttl, profile)
+        self._entries.move_to_end(id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, id, field, value):
+        entry = self._entries.get(id)
+        if entry is not None:
+            entry[1][field] = value
+
+    def drop(self, id):
+        self._entries.pop(id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            entries=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups else 0.0,
+        )
+
 
 class Database:
     def __init__(self, uri, database_name):
         self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
         self.db = self._client[database_name]
         self.col = self.db.users
+        self.cache = UserCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+        # User ids known to be stored; AddUser skips MongoDB for these
+        self._known = OrderedDict()
+
+    async def ensure_indexes(self):
+        """Unique index on users.id, created at startup (old duplicates are merged first)."""
+        try:
+            await self.col.create_index('id', unique=True)
+        except OperationFailure as e:
+            logger.warning(f"users.id has duplicates, removing them: {e}")
+            dupes = self.col.aggregate([
+                {'$group': {'_id': '$id', 'ids': {'$push': '$_id'}, 'n': {'$sum': 1}}},
+                {'$match': {'n': {'$gt': 1}}}
+            ])
+            async for group in dupes:
+                await self.col.delete_many({'_id': {'$in': group['ids'][1:]}})
+            await self.col.create_index('id', unique=True)
+
+    def is_known(self, id):
+        if id in self._known:
+            self._known.move_to_end(id)
+            return True
+        return False
+
+    def _remember(self, id):
+        self._known[id] = None
+        self._known.move_to_end(id)
+        while len(self._known) > Config.KNOWN_USERS_MAX:
+            self._known.popitem(last=False)
+
+    async def get_profile(self, id):
+        """The user's settings, from the cache or one projected find_one."""
+        id = int(id)
+        profile = self.cache.get(id)
+        if profile is None:
+            profile = await self.col.find_one({'id': id}, PROFILE_PROJECTION)
+            if profile is not None:
+                self.cache.put(id, profile)
+                self._remember(id)
+        return profile
+
+    async def _set(self, id, field, value):
+        await self.col.update_one({'id': id}, {'$set': {field: value}})
+        self.cache.update(int(id), field, value)
 
     def new_user(self, id):
         return dict(
@@ -22,11 +123,18 @@ class Database:
         )
 
     async def add_user(self, id):
+        """Idempotent upsert; returns True when the user was new."""
+        id = int(id)
         user = self.new_user(id)
-        await self.col.insert_one(user)
+        result = await self.col.update_one({'id': id}, {'$setOnInsert': dict(user)}, upsert=True)
+        self._remember(id)
+        if result.upserted_id is not None:
+            self.cache.put(id, user)
+            return True
+        return False
 
     async def is_user_exist(self, id):
-        user = await self.col.find_one({'id': int(id)})
+        user = await self.get_profile(id)
         return bool(user)
 
     async def total_users_count(self):
@@ -36,40 +144,57 @@ class Database:
     async def get_all_users(self):
         return self.col.find({})
 
+    def iter_user_ids(self, after=None, batch_size=500):
+        """Cursor over {_id, id} of every user in _id order, optionally after an _id."""
+        query = {'_id': {'$gt': after}} if after is not None else {}
+        return self.col.find(query, {'id': 1}).sort('_id', 1).batch_size(batch_size)
+
+    async def delete_users(self, user_ids):
+        """Remove many users in one bulk_write round trip."""
+        if not user_ids:
+            return 0
+        result = await self.col.bulk_write([DeleteMany({'id': int(u)}) for u in user_ids], ordered=False)
+        for u in user_ids:
+            self.cache.drop(int(u))
+            self._known.pop(int(u), None)
+        return result.deleted_count
+
     async def delete_user(self, user_id):
         await self.col.delete_many({'id': int(user_id)})
+        self.cache.drop(int(user_id))
+        self._known.pop(int(user_id), None)
 
     async def set_apply_caption(self, id, apply_caption):
-        await self.col.update_one({'id': id}, {'$set': {'apply_caption': apply_caption}})
+        await self._set(id, 'apply_caption', apply_caption)
 
     async def get_apply_caption(self, id):
-        user = await self.col.find_one({'id': int(id)})
+        user = await self.get_profile(id)
         return user.get('apply_caption', True)
 
     async def set_upload_as_doc(self, id, upload_as_doc):
-        await self.col.update_one({'id': id}, {'$set': {'upload_as_doc': upload_as_doc}})
+        await self._set(id, 'upload_as_doc', upload_as_doc)
 
     async def get_upload_as_doc(self, id):
-        user = await self.col.find_one({'id': int(id)})
+        user = await self.get_profile(id)
         return user.get('upload_as_doc', False)
 
     async def set_thumbnail(self, id, thumbnail):
-        await self.col.update_one({'id': id}, {'$set': {'thumbnail': thumbnail}})
+        await self._set(id, 'thumbnail', thumbnail)
 
     async def get_thumbnail(self, id):
-        user = await self.col.find_one({'id': int(id)})
+        user = await self.get_profile(id)
         return user.get('thumbnail', None)
 
     async def set_caption(self, id, caption):
-        await self.col.update_one({'id': id}, {'$set': {'caption': caption}})
+        await self._set(id, 'caption', caption)
 
     async def get_caption(self, id):
-        user = await self.col.find_one({'id': int(id)})
+        user = await self.get_profile(id)
         return user.get('caption', None)
 
     async def get_user_data(self, id) -> dict:
-        user = await self.col.find_one({'id': int(id)})
-        return user or None
+        user = await self.get_profile(id)
+        return dict(user) if user else None
 
 
 db = Database(Config.DATABASE_URL, "UploadLinkToFileBot")
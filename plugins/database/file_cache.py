@@ -0,0 +1,76 @@
+# Telegram file_id cache: (normalized URL, format_id, upload mode) -> file_id
+# Already uploaded media is re-sent with send_cached_media instead of being
+# downloaded and uploaded again.
+
+import time
+import hashlib
+from plugins.config import Config
+from plugins.database.database import db
+from plugins.functions.extract_cache import normalize_url
+
+
+class FileCache:
+    def __init__(self, database, max_entries):
+        self.col = database.db.file_ids
+        self.max_entries = max_entries
+        self._indexed = False
+
+    async def _ensure_indexes(self):
+        if not self._indexed:
+            await self.col.create_index("key", unique=True)
+            await self.col.create_index("url")
+            await self.col.create_index("last_used")
+            self._indexed = True
+
+    @staticmethod
+    def make_key(url, format_id, mode):
+        raw = f"{normalize_url(url)}|{format_id}|{mode}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    async def get(self, url, format_id, mode):
+        await self._ensure_indexes()
+        return await self.col.find_one_and_update(
+            {'key': self.make_key(url, format_id, mode)},
+            {'$set': {'last_used': time.time()}, '$inc': {'hits': 1}}
+        )
+
+    async def put(self, url, format_id, mode, media, caption=None):
+        await self._ensure_indexes()
+        now = time.time()
+        await self.col.update_one(
+            {'key': self.make_key(url, format_id, mode)},
+            {'$set': dict(
+                url=normalize_url(url),
+                format_id=format_id,
+                mode=mode,
+                file_id=media.file_id,
+                file_unique_id=media.file_unique_id,
+                file_size=getattr(media, "file_size", 0),
+                caption=caption,
+                last_used=now
+            ), '$setOnInsert': {'created': now, 'hits': 0}},
+            upsert=True
+        )
+        await self._evict()
+
+    async def _evict(self):
+        overflow = await self.col.estimated_document_count() - self.max_entries
+        if overflow <= 0:
+            return
+        stale = self.col.find({}, {'_id': 1}).sort('last_used', 1).limit(overflow)
+        ids = [doc['_id'] async for doc in stale]
+        if ids:
+            await self.col.delete_many({'_id': {'$in': ids}})
+
+    async def invalidate(self, url, format_id=None, mode=None):
+        """Drop one (url, format, mode) entry, or every entry of url."""
+        await self._ensure_indexes()
+        if format_id is not None and mode is not None:
+            query = {'key': self.make_key(url, format_id, mode)}
+        else:
+            query = {'url': normalize_url(url)}
+        result = await self.col.delete_many(query)
+        return result.deleted_count
+
+
+file_cache = FileCache(db, Config.FILE_CACHE_MAX)
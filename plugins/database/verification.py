@@ -0,0 +1,80 @@
+# Verification state in MongoDB. Tokens and "verified until midnight"
+# records both carry an expires_at date with a TTL index, so MongoDB drops
+# them on its own. Verified users are cached in memory until they expire.
+
+import time
+import datetime
+from collections import OrderedDict
+from plugins.config import Config
+from plugins.database.database import db
+
+# Unverified answers are cached briefly; verifying updates the cache directly
+NEGATIVE_TTL = 60
+CACHE_MAX = 10000
+
+
+def next_midnight():
+    """Local midnight after today, as an aware UTC datetime (verification lasts the day)."""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    local = datetime.datetime.combine(tomorrow, datetime.time.min).astimezone()
+    return local.astimezone(datetime.timezone.utc)
+
+
+class VerificationStore:
+    def __init__(self, database, token_ttl):
+        self.tokens = database.db.verify_tokens
+        self.verified = database.db.verified_users
+        self.token_ttl = token_ttl
+        self._cache = OrderedDict()
+        self._indexed = False
+
+    async def _ensure_indexes(self):
+        if not self._indexed:
+            await self.tokens.create_index("expires_at", expireAfterSeconds=0)
+            await self.verified.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+    async def new_token(self, user_id, token):
+        """Store token as user_id's only pending token."""
+        await self._ensure_indexes()
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.token_ttl)
+        await self.tokens.delete_many({'user_id': user_id})
+        await self.tokens.insert_one({'_id': token, 'user_id': user_id, 'used': False, 'expires_at': expires_at})
+
+    async def token_valid(self, user_id, token):
+        await self._ensure_indexes()
+        doc = await self.tokens.find_one({'_id': token, 'user_id': user_id})
+        # The TTL monitor runs once a minute, so check the date too
+        return bool(doc) and not doc['used'] and doc['expires_at'].replace(tzinfo=datetime.timezone.utc) > datetime.datetime.now(datetime.timezone.utc)
+
+    async def mark_verified(self, user_id, token):
+        await self._ensure_indexes()
+        expires_at = next_midnight()
+        await self.tokens.update_one({'_id': token}, {'$set': {'used': True}})
+        await self.verified.update_one(
+            {'_id': user_id}, {'$set': {'expires_at': expires_at}}, upsert=True
+        )
+        self._remember(user_id, True, expires_at.timestamp())
+
+    def _remember(self, user_id, verified, until):
+        self._cache[user_id] = (verified, until)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > CACHE_MAX:
+            self._cache.popitem(last=False)
+
+    async def is_verified(self, user_id):
+        now = time.time()
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        await self._ensure_indexes()
+        doc = await self.verified.find_one({'_id': user_id})
+        until = doc['expires_at'].replace(tzinfo=datetime.timezone.utc).timestamp() if doc else 0
+        if until > now:
+            self._remember(user_id, True, until)
+            return True
+        self._remember(user_id, False, now + NEGATIVE_TTL)
+        return False
+
+
+verification = VerificationStore(db, Config.VERIFY_TOKEN_TTL)
@@ -16,10 +16,14 @@ from plugins.config import Config
 from plugins.script import Translation
 from plugins.thumbnail import *
 from plugins.database.database import db
+from plugins.functions.scheduler import scheduler
+from plugins.functions.stream_upload import StreamUpload, send_streamed
+from plugins.functions.edits import edits
+from plugins.functions.ranged_download import RangedDownload, RangedDownloadError
+from plugins.functions.disk import disk, DiskFullError
+from plugins.functions.thumbs import thumbs
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
-from plugins.functions.display_progress import progress_for_pyrogram, humanbytes, TimeFormatter
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
+from plugins.functions.display_progress import progress_for_pyrogram, cancel_markup, humanbytes, TimeFormatter
 from PIL import Image
 from pyrogram import enums 
 
@@ -30,8 +34,6 @@ async def ddl_call_back(bot, update):
     cb_data = update.data
     # youtube_dl extractors
     tg_send_type, youtube_dl_format, youtube_dl_ext = cb_data.split("=")
-    thumb_image_path = Config.DOWNLOAD_LOCATION + \
-        "/" + str(update.from_user.id) + ".jpg"
     youtube_dl_url = update.message.reply_to_message.text
     custom_file_name = os.path.basename(youtube_dl_url)
     if "|" in youtube_dl_url:
@@ -62,6 +64,20 @@ async def ddl_call_back(bot, update):
                 o = entity.offset
                 l = entity.length
                 youtube_dl_url = youtube_dl_url[o:o + l]
+    # Download + upload run in the scheduler; the handler returns right away
+    job = scheduler.submit(
+        update.from_user.id,
+        lambda job: ddl_job(job, bot, update, tg_send_type, youtube_dl_url, custom_file_name),
+        name="ddl"
+    )
+    position = scheduler.position(job)
+    try:
+        await update.answer(f"⏳ Queued, position {position}" if position else "⬇️ Download started")
+    except:
+        pass
+
+
+async def ddl_job(job, bot, update, tg_send_type, youtube_dl_url, custom_file_name):
     description = Translation.CUSTOM_CAPTION_UL_FILE
     start = datetime.now()
     await update.message.edit_caption(
@@ -72,7 +88,27 @@ async def ddl_call_back(bot, update):
     if not os.path.isdir(tmp_directory_for_each_user):
         os.makedirs(tmp_directory_for_each_user)
     download_directory = tmp_directory_for_each_user + "/" + custom_file_name
-    command_to_exec = []
+    thumb_image_path = None
+    # Every thumbnail used for this upload, so the one-off ones get removed
+    thumbnails = []
+    stream = None
+    if Config.STREAM_UPLOAD and tg_send_type not in ("audio", "vm") \
+            and (await db.get_upload_as_doc(update.from_user.id)) is False:
+        # Documents can be uploaded while the direct link downloads
+        stream = StreamUpload(
+            bot,
+            download_directory,
+            progress=progress_for_pyrogram,
+            progress_args=(Translation.UPLOAD_START, update.message, time.time(), job),
+            slot=lambda: scheduler.stream_slot(job)
+        )
+
+    async def reserve(total):
+        # Content-Length is the first size we learn for a direct link
+        disk.track(job.id, download_directory + ".part")
+        disk.track(job.id, download_directory)
+        return await disk.reserve(job.id, total)
+
     async with aiohttp.ClientSession() as session:
         c_time = time.time()
         try:
@@ -81,174 +117,226 @@ async def ddl_call_back(bot, update):
                 session,
                 youtube_dl_url,
                 download_directory,
-                update.message.chat.id,
-                update.message.id,
-                c_time
+                update.message,
+                c_time,
+                on_length=stream.start if stream else None,
+                reserve=reserve,
+                job=job
             )
         except asyncio.TimeoutError:
+            if stream:
+                stream.abort()
+            await edits.forget(update.message)
             await bot.edit_message_text(
                 text=Translation.SLOW_URL_DECED,
                 chat_id=update.message.chat.id,
                 message_id=update.message.id
             )
             return False
-    if os.path.exists(download_directory):
-        end_one = datetime.now()
-        await update.message.edit_caption(
-            caption=Translation.UPLOAD_START,
-            parse_mode=enums.ParseMode.HTML
-        )
-        file_size = Config.TG_MAX_FILE_SIZE + 1
-        try:
-            file_size = os.stat(download_directory).st_size
-        except FileNotFoundError as exc:
-            download_directory = os.path.splitext(download_directory)[0] + "." + "mkv"
-            # https://stackoverflow.com/a/678242/4723940
-            file_size = os.stat(download_directory).st_size
-        if file_size > Config.TG_MAX_FILE_SIZE:
+        except (RangedDownloadError, DiskFullError, aiohttp.ClientError) as e:
+            if stream:
+                stream.abort()
+            await edits.forget(update.message)
+            await update.message.edit_caption(f"❌ Download failed: {e}"[:1024])
+            return False
+        except asyncio.CancelledError:
+            if stream:
+                stream.abort()
+            raise
+        finally:
+            if stream:
+                stream.download_finished()
+            await edits.forget(update.message)
+    input_file = await stream.result() if stream else None
+    job.check()
+    async with scheduler.upload_slot(job):
+        if os.path.exists(download_directory):
+            end_one = datetime.now()
             await update.message.edit_caption(
-                
-                caption=Translation.RCHD_TG_API_LIMIT,
+                caption=Translation.UPLOAD_START,
                 parse_mode=enums.ParseMode.HTML
             )
-        else:
-            
-            start_time = time.time()
-            if (await db.get_upload_as_doc(update.from_user.id)) is False:
-                thumbnail = await Gthumb01(bot, update)
-                await update.message.reply_document(
-                    document=download_directory,
-                    thumb=thumbnail,
-                    caption=description,
-                    parse_mode=enums.ParseMode.HTML,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time
-                    )
+            file_size = Config.TG_MAX_FILE_SIZE + 1
+            try:
+                file_size = os.stat(download_directory).st_size
+            except FileNotFoundError:
+                download_directory = os.path.splitext(download_directory)[0] + "." + "mkv"
+                # https://stackoverflow.com/a/678242/4723940
+                file_size = os.stat(download_directory).st_size
+            if file_size > Config.TG_MAX_FILE_SIZE:
+                await update.message.edit_caption(
+
+                    caption=Translation.RCHD_TG_API_LIMIT,
+                    parse_mode=enums.ParseMode.HTML
                 )
             else:
-                 width, height, duration = await Mdata01(download_directory)
-                 thumb_image_path = await Gthumb02(bot, update, duration, download_directory)
-                 await update.message.reply_video(
-                    video=download_directory,
-                    caption=description,
-                    duration=duration,
-                    width=width,
-                    height=height,
-                    supports_streaming=True,
-                    parse_mode=enums.ParseMode.HTML,
-                    thumb=thumb_image_path,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
+
+                start_time = time.time()
+                if input_file is not None:
+                    # Parts were already uploaded while downloading
+                    thumb_image_path = await Gthumb01(bot, update)
+                    thumbnails.append(thumb_image_path)
+                    await send_streamed(
+                        bot,
                         update.message,
-                        start_time
+                        input_file,
+                        os.path.basename(download_directory),
+                        caption=description,
+                        parse_mode=enums.ParseMode.HTML,
+                        thumb=thumb_image_path
                     )
-                )
-            if tg_send_type == "audio":
-                duration = await Mdata03(download_directory)
-                thumbnail = await Gthumb01(bot, update)
-                await update.message.reply_audio(
-                    audio=download_directory,
-                    caption=description,
-                    parse_mode=enums.ParseMode.HTML,
-                    duration=duration,
-                    thumb=thumbnail,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time
+                elif (await db.get_upload_as_doc(update.from_user.id)) is False:
+                    thumb_image_path = await Gthumb01(bot, update)
+                    thumbnails.append(thumb_image_path)
+                    await update.message.reply_document(
+                        document=download_directory,
+                        thumb=thumb_image_path,
+                        caption=description,
+                        parse_mode=enums.ParseMode.HTML,
+                        progress=progress_for_pyrogram,
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                            job
+                        )
                     )
-                )
-            elif tg_send_type == "vm":
-                width, duration = await Mdata02(download_directory)
-                thumbnail = await Gthumb02(bot, update, duration, download_directory)
-                await update.message.reply_video_note(
-                    video_note=download_directory,
-                    duration=duration,
-                    length=width,
-                    thumb=thumbnail,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        Translation.UPLOAD_START,
-                        update.message,
-                        start_time
+                else:
+                     width, height, duration = await Mdata01(download_directory)
+                     thumb_image_path = await Gthumb02(bot, update, duration, download_directory)
+                     thumbnails.append(thumb_image_path)
+                     await update.message.reply_video(
+                        video=download_directory,
+                        caption=description,
+                        duration=duration,
+                        width=width,
+                        height=height,
+                        supports_streaming=True,
+                        parse_mode=enums.ParseMode.HTML,
+                        thumb=thumb_image_path,
+                        progress=progress_for_pyrogram,
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                            job
+                        )
+                    )
+                if tg_send_type == "audio":
+                    duration = await Mdata03(download_directory)
+                    thumb_image_path = await Gthumb01(bot, update)
+                    thumbnails.append(thumb_image_path)
+                    await update.message.reply_audio(
+                        audio=download_directory,
+                        caption=description,
+                        parse_mode=enums.ParseMode.HTML,
+                        duration=duration,
+                        thumb=thumb_image_path,
+                        progress=progress_for_pyrogram,
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                            job
+                        )
                     )
+                elif tg_send_type == "vm":
+                    width, duration = await Mdata02(download_directory)
+                    thumb_image_path = await Gthumb02(bot, update, duration, download_directory)
+                    thumbnails.append(thumb_image_path)
+                    await update.message.reply_video_note(
+                        video_note=download_directory,
+                        duration=duration,
+                        length=width,
+                        thumb=thumb_image_path,
+                        progress=progress_for_pyrogram,
+                        progress_args=(
+                            Translation.UPLOAD_START,
+                            update.message,
+                            start_time,
+                            job
+                        )
+                    )
+                else:
+                    logger.info("Did this happen? :\\")
+                # A stopped transmission returns None instead of raising
+                job.check()
+                end_two = datetime.now()
+                await edits.forget(update.message)
+                # Prepared custom thumbnails are kept for the next upload
+                leftovers = [download_directory]
+                leftovers += [t for t in thumbnails if t and not thumbs.owns(t)]
+                for path in leftovers:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                time_taken_for_download = (end_one - start).seconds
+                time_taken_for_upload = (end_two - end_one).seconds
+                await update.message.edit_caption(
+                    caption=Translation.AFTER_SUCCESSFUL_UPLOAD_MSG_WITH_TS.format(time_taken_for_download, time_taken_for_upload),
+
+                    parse_mode=enums.ParseMode.HTML
                 )
-            else:
-                logger.info("Did this happen? :\\")
-            end_two = datetime.now()
-            try:
-                os.remove(download_directory)
-                os.remove(thumb_image_path)
-            except:
-                pass
-            time_taken_for_download = (end_one - start).seconds
-            time_taken_for_upload = (end_two - end_one).seconds
+        else:
             await update.message.edit_caption(
-                caption=Translation.AFTER_SUCCESSFUL_UPLOAD_MSG_WITH_TS.format(time_taken_for_download, time_taken_for_upload),
-               
+                caption=Translation.NO_VOID_FORMAT_FOUND.format("Incorrect Link"),
                 parse_mode=enums.ParseMode.HTML
             )
-    else:
-        await update.message.edit_caption(
-            caption=Translation.NO_VOID_FORMAT_FOUND.format("Incorrect Link"),
-            parse_mode=enums.ParseMode.HTML
-        )
 
-async def download_coroutine(bot, session, url, file_name, chat_id, message_id, start):
-    downloaded = 0
-    display_message = ""
-    async with session.get(url, timeout=Config.PROCESS_MAX_TIMEOUT) as response:
-        total_length = int(response.headers["Content-Length"])
-        content_type = response.headers["Content-Type"]
-        if "text" in content_type and total_length < 500:
-            return await response.release()
-        await bot.edit_message_text(
-            chat_id,
-            message_id,
-            text="""Initiating Download
-URL: {}
-File Size: {}""".format(url, humanbytes(total_length))
-        )
-        with open(file_name, "wb") as f_handle:
-            while True:
-                chunk = await response.content.read(Config.CHUNK_SIZE)
-                if not chunk:
-                    break
-                f_handle.write(chunk)
-                downloaded += Config.CHUNK_SIZE
-                now = time.time()
-                diff = now - start
-                if round(diff % 5.00) == 0 or downloaded == total_length:
-                    percentage = downloaded * 100 / total_length
-                    speed = downloaded / diff
-                    elapsed_time = round(diff) * 1000
-                    time_to_completion = round(
-                        (total_length - downloaded) / speed) * 1000
-                    estimated_total_time = elapsed_time + time_to_completion
-                    try:
-                        current_message = """**Download Status**
+async def download_coroutine(bot, session, url, file_name, message, start, on_length=None, reserve=None, job=None):
+    last_submit = 0
+    markup = cancel_markup(job)
+
+    def on_progress(downloaded, total_length):
+        nonlocal last_submit
+        now = time.time()
+        # The coalescer paces the edits; only skip rebuilding the text per chunk
+        if now - last_submit < 1 and downloaded != total_length:
+            return
+        last_submit = now
+        diff = max(now - start, 0.001)
+        speed = downloaded / diff
+        estimated_total_time = round(diff) * 1000
+        if total_length and speed:
+            estimated_total_time += round((total_length - downloaded) / speed) * 1000
+        edits.submit(
+            message,
+            """**Download Status**
 URL: {}
 File Size: {}
 Downloaded: {}
+Speed: {}/s
 ETA: {}""".format(
     url,
     humanbytes(total_length),
     humanbytes(downloaded),
+    humanbytes(speed),
     TimeFormatter(estimated_total_time)
-)
-                        if current_message != display_message:
-                            await bot.edit_message_text(
-                                chat_id,
-                                message_id,
-                                text=current_message
-                            )
-                            display_message = current_message
-                    except Exception as e:
-                        logger.info(str(e))
-                        pass
-        return await response.release()
+),
+            reply_markup=markup
+        )
+
+    def announce(total_length):
+        edits.submit(
+            message,
+            """Initiating Download
+URL: {}
+File Size: {}""".format(url, humanbytes(total_length)),
+            reply_markup=markup
+        )
+        if on_length is not None:
+            on_length(total_length)
+
+    # Streamed uploads read the file in order, so keep to one connection then
+    download = RangedDownload(
+        session,
+        url,
+        file_name,
+        connections=1 if on_length is not None else None,
+        progress=on_progress,
+        on_length=announce,
+        reserve=reserve
+    )
+    await download.run()
+    logger.info(f"Downloaded {humanbytes(download.downloaded)} with {'ranged' if download.segmented else 'single'} connection(s)")
@@ -1,5 +1,5 @@
 # echo.py — FIXED VERSION - VIDEO ONLY
-# Native impersonate PRIMARY + extractor_args FALLBACK
+# Native impersonate PRIMARY hedged with extractor_args FALLBACK
 # Video quality selection only (1080p, 720p, 480p, Best)
 
 import logging
@@ -7,17 +7,19 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-import os, json, time, random, asyncio, shutil
+import os
 from pyrogram import filters, Client, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from plugins.config import Config
 from plugins.script import Translation
-from plugins.functions.ran_text import random_char
 from plugins.database.add import AddUser
 from plugins.functions.forcesub import handle_force_subscribe
 from pyrogram.errors import UserNotParticipant
 from plugins.functions.display_progress import TimeFormatter, humanbytes
-from plugins.functions.impersonate import impersonate_final_url
+from plugins.functions.redirects import redirects
+from plugins.functions.extract_cache import extract_cache
+from plugins.functions.hedge import hedged_extract
+from plugins.functions.sessions import sessions
 
 cookies_file = 'cookies.txt' if os.path.exists('cookies.txt') else None
 os.makedirs(Config.DOWNLOAD_LOCATION, exist_ok=True)
@@ -37,11 +39,11 @@ def sanitize_filename(name):
         name = "video"
     return name
 
-def sanitize_url(url):
+async def sanitize_url(url):
     """Resolve CDN redirects using curl-impersonate"""
     if any(x in url.lower() for x in ["get_stream", "getstream", "porndos", "okcdn", "redirect"]):
         try:
-            resolved = impersonate_final_url(url)
+            resolved = await redirects.resolve(url)
             logger.info(f"CDN redirect resolved: {url} -> {resolved}")
             return resolved
         except:
@@ -85,16 +87,12 @@ async def echo(bot, update):
     # 2) Parse URL + rename
     full_text = update.text.strip()
     url = full_text
-    custom_name = None
     user = update.from_user.id
 
     if "|" in full_text:
         p = [x.strip() for x in full_text.split("|")]
         if len(p) >= 2:
             url = p[0]
-            custom_name = sanitize_filename(p[1])
-
-    url = sanitize_url(url)
 
     # 3) Show processing message
     wait_msg = await bot.send_message(
@@ -103,96 +101,49 @@ async def echo(bot, update):
         reply_to_message_id=update.id
     )
 
-    # 4) Try NATIVE impersonate first
-    cmd_native = [
-        "yt-dlp",
-        "--no-warnings",
-        "--allow-dynamic-mpd",
-        "--no-check-certificate",
-        "--impersonate", "chrome",
-        "-j",
-        url
-    ]
-
-    if cookies_file:
-        cmd_native.extend(["--cookies", cookies_file])
-    if Config.HTTP_PROXY:
-        cmd_native.extend(["--proxy", Config.HTTP_PROXY])
-
-    logger.info(f"🔥 PRIMARY: {' '.join(cmd_native)}")
-
-    info = None
-    try:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd_native,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        out, err = await proc.communicate()
-
-        if proc.returncode == 0 and out:
-            data = out.decode().strip()
-            if "\n" in data:
-                data = data.split("\n")[0]
-            info = json.loads(data)
-            logger.info("✅ Native impersonate SUCCESS")
-
-    except Exception as e:
-        logger.warning(f"⚠️ Native failed: {e}")
-
-    # 5) FALLBACK to extractor_args
-    if not info:
-        logger.info("🔄 Trying FALLBACK extractor_args...")
-        
-        cmd_fallback = [
-            "yt-dlp",
+    # Repeat links skip yt-dlp entirely
+    cache_url = url
+    info = await extract_cache.get(cache_url, cookies_file, Config.HTTP_PROXY)
+    if info is not None:
+        logger.info(f"⚡ Extraction cache HIT: {cache_url}")
+    else:
+        url = await sanitize_url(url)
+
+        # 4) NATIVE impersonate raced against the extractor_args FALLBACK
+        args_native = [
+            "--no-warnings",
+            "--allow-dynamic-mpd",
+            "--no-check-certificate",
+            "--impersonate", "chrome",
+            "--playlist-items", "1"
+        ]
+        args_fallback = [
             "--no-warnings",
             "--allow-dynamic-mpd",
             "--no-check-certificate",
             "--extractor-args", "generic:impersonate=chrome",
-            "-j",
-            url
+            "--playlist-items", "1"
         ]
 
-        if cookies_file:
-            cmd_fallback.extend(["--cookies", cookies_file])
-        if Config.HTTP_PROXY:
-            cmd_fallback.extend(["--proxy", Config.HTTP_PROXY])
+        for args in (args_native, args_fallback):
+            if cookies_file:
+                args.extend(["--cookies", cookies_file])
+            if Config.HTTP_PROXY:
+                args.extend(["--proxy", Config.HTTP_PROXY])
 
-        logger.info(f"🔄 FALLBACK: {' '.join(cmd_fallback)}")
+        logger.info(f"🔥 PRIMARY: {' '.join(args_native)} {url}")
+        logger.info(f"🔄 FALLBACK: {' '.join(args_fallback)} {url}")
 
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd_fallback,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            out, err = await proc.communicate()
-            err_text = err.decode().strip()
-
-            if err_text and "nonnumeric port" not in err_text:
-                await wait_msg.delete()
-                await update.reply_text(f"❌ Error:\n<code>{err_text}</code>", parse_mode=enums.ParseMode.HTML)
-                return
-
-            data = out.decode().strip()
-            if "\n" in data:
-                data = data.split("\n")[0]
-
-            info = json.loads(data)
-            logger.info("✅ Fallback SUCCESS")
-
+            info = await hedged_extract(url, args_native, args_fallback)
         except Exception as e:
             await wait_msg.delete()
-            await update.reply_text(f"❌ Extraction failed:\n{e}")
+            await update.reply_text(f"❌ Error:\n<code>{e}</code>", parse_mode=enums.ParseMode.HTML)
             return
 
-    # 6) Save session
-    sess_id = random_char(5)
-    sess_file = os.path.join(Config.DOWNLOAD_LOCATION, f"{user}{sess_id}.json")
-    json.dump(info, open(sess_file, "w"), ensure_ascii=False)
+        await extract_cache.put(cache_url, info, cookies_file, Config.HTTP_PROXY)
 
-    # 7) Build VIDEO format buttons only
+    # 6) Collect VIDEO formats only
     formats = info.get("formats", [])
     best_audio = None
 
@@ -222,6 +173,9 @@ async def echo(bot, update):
         if h not in video_formats or size > video_formats[h][2]:
             video_formats[h] = (fid, ext, size, h)
 
+    # 7) Save a compact session (only what button.py needs)
+    sess_id = await sessions.create(user, info, [v[0] for v in video_formats.values()])
+
     # Build buttons for common resolutions
     kb = []
     
@@ -0,0 +1,210 @@
+# Broadcast engine: BROADCAST_SENDERS concurrent senders share one token
+# bucket sized to Telegram's bot limits. A FloodWait pauses every sender and
+# lowers the rate, which climbs back slowly while sends succeed. Users that
+# blocked the bot or were deleted are removed in bulk. Progress is
+# checkpointed every CHECKPOINT_EVERY users so a restart can resume.
+# Delivery across a restart is at-least-once: users that were in flight past
+# the checkpoint get the message again, but are only counted once.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import asyncio
+import traceback
+from collections import OrderedDict
+from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
+from plugins.config import Config
+from plugins.database.database import db
+
+# Dead users are removed from the database in batches of this size
+DEAD_BATCH = 200
+# Successful sends needed before the rate climbs by one message/second again
+RECOVER_AFTER = 100
+MIN_RATE = 1.0
+CHECKPOINT_EVERY = 500
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._streak = 0
+
+    async def take(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def flood_wait(self, seconds):
+        """Pause everyone and back off multiplicatively."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.rate = max(MIN_RATE, self.rate * 0.7)
+        self._tokens = 0
+        self._streak = 0
+        logger.warning(f"Broadcast FloodWait {seconds}s, rate now {self.rate:.1f}/s")
+
+    def success(self):
+        self._streak += 1
+        if self._streak >= RECOVER_AFTER and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 1)
+            self._streak = 0
+
+
+class Broadcast:
+    def __init__(self, broadcast_id, message, total, log_file=None, checkpoint=None, resume=None):
+        self.id = broadcast_id
+        self.message = message
+        self.total = total
+        self.log_file = log_file
+        # async checkpoint(broadcast), called every CHECKPOINT_EVERY users
+        self.checkpoint = checkpoint
+        self.bucket = TokenBucket(Config.BROADCAST_RATE)
+        resume = resume or {}
+        self.last_id = resume.get('last_id')
+        self.done = resume.get('done', 0)
+        self.success = resume.get('success', 0)
+        self.failed = resume.get('failed', 0)
+        self.removed = resume.get('removed', 0)
+        self.started = time.time()
+        self.created = resume.get('created', self.started)
+        self._done_at_start = self.done
+        self.cancelled = False
+        self._dead = []
+        # _id -> status (None until sent), in cursor order; the finished
+        # prefix moves last_id and the counters saved with it
+        self._in_flight = OrderedDict()
+        self._committed = dict(done=self.done, success=self.success, failed=self.failed)
+
+    async def _log(self, line):
+        if self.log_file is not None:
+            await self.log_file.write(line)
+
+    async def _send(self, user_id):
+        """(status, log line) like the old send_msg: 200 sent, 400 dead user, 500 other error."""
+        for attempt in range(5):
+            await self.bucket.take()
+            try:
+                await self.message.copy(chat_id=user_id)
+                self.bucket.success()
+                return 200, None
+            except FloodWait as e:
+                self.bucket.flood_wait(e.value)
+            except InputUserDeactivated:
+                return 400, f"{user_id} : deactivated\n"
+            except UserIsBlocked:
+                return 400, f"{user_id} : blocked the bot\n"
+            except PeerIdInvalid:
+                return 400, f"{user_id} : user id invalid\n"
+            except Exception:
+                return 500, f"{user_id} : {traceback.format_exc()}\n"
+        return 500, f"{user_id} : gave up after repeated FloodWait\n"
+
+    async def _flush_dead(self):
+        dead, self._dead = self._dead, []
+        if dead:
+            self.removed += await db.delete_users(dead)
+
+    def _commit(self, status):
+        self._committed['done'] += 1
+        self._committed['success' if status == 200 else 'failed'] += 1
+
+    def _advance(self, doc_id, status):
+        if status == 400:
+            # Dead users are deleted before the next checkpoint and never
+            # come back on resume, so they count at once
+            self._commit(status)
+            status = 0
+        self._in_flight[doc_id] = status
+        while self._in_flight:
+            first, status = next(iter(self._in_flight.items()))
+            if status is None:
+                break
+            self._in_flight.popitem(last=False)
+            self.last_id = first
+            if status:
+                self._commit(status)
+
+    def committed(self):
+        """last_id and the counters covering exactly the users up to it."""
+        return dict(last_id=self.last_id, **self._committed)
+
+    async def _save(self):
+        # Dead users go first so a resumed run never re-counts them
+        await self._flush_dead()
+        if self.checkpoint is not None:
+            await self.checkpoint(self)
+
+    async def _record(self, user_id, status, line):
+        if line is not None:
+            await self._log(line)
+        if status == 200:
+            self.success += 1
+        else:
+            self.failed += 1
+        if status == 400:
+            self._dead.append(user_id)
+            if len(self._dead) >= DEAD_BATCH:
+                await self._flush_dead()
+        self.done += 1
+        if self.done % CHECKPOINT_EVERY == 0:
+            await self._save()
+
+    async def run(self, cursor):
+        """Send to every user document ({'id': ...}) the cursor yields."""
+        queue = asyncio.Queue(Config.BROADCAST_SENDERS * 4)
+
+        async def sender():
+            while True:
+                doc = await queue.get()
+                if doc is None:
+                    return
+                if self.cancelled:
+                    continue
+                user_id = int(doc['id'])
+                status, line = await self._send(user_id)
+                self._advance(doc['_id'], status)
+                await self._record(user_id, status, line)
+
+        senders = [asyncio.create_task(sender()) for _ in range(max(1, Config.BROADCAST_SENDERS))]
+        try:
+            async for doc in cursor:
+                if self.cancelled:
+                    break
+                self._in_flight[doc['_id']] = None
+                await queue.put(doc)
+            for _ in senders:
+                await queue.put(None)
+            await asyncio.gather(*senders)
+        finally:
+            for task in senders:
+                task.cancel()
+            await self._save()
+
+    def stats(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        speed = (self.done - self._done_at_start) / elapsed
+        remaining = max(0, self.total - self.done)
+        return dict(
+            total=self.total,
+            done=self.done,
+            success=self.success,
+            failed=self.failed,
+            removed=self.removed,
+            speed=speed,
+            eta=remaining / speed if speed else None,
+            rate=self.bucket.rate,
+        )
@@ -0,0 +1,196 @@
+# Disk admission control for DOWNLOAD_LOCATION.
+# Each job reserves its announced size (filesize / filesize_approx /
+# Content-Length) before it downloads. Reservations are checked against live
+# free space minus what running jobs still have to write, so parallel 2 GB
+# jobs queue instead of all filling the disk and failing together.
+# What each job has written is measured in a worker thread at most every
+# USAGE_TTL seconds; the checks in between use the last measurement.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import shutil
+import asyncio
+from plugins.config import Config
+
+# How often waiting jobs look at the disk again (space can free up outside us)
+RECHECK_INTERVAL = 5
+# How long a measurement of the bytes jobs have written stays good
+USAGE_TTL = 2
+# Merged formats keep the separate parts next to the output until the merge ends
+MERGE_FACTOR = 2.2
+
+
+class DiskFullError(Exception):
+    pass
+
+
+def tree_size(path):
+    """Bytes under path (a file or a directory tree)."""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+    except OSError:
+        return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def announced_size(info, format_id):
+    """Disk bytes a yt-dlp format needs, from filesize / filesize_approx; None if unknown.
+
+    format_id may name a merge ("137+140"); every part must have a size.
+    """
+    formats = {f.get("format_id"): f for f in info.get("formats") or []}
+    parts = [formats.get(p) for p in format_id.split("+")]
+    size = 0
+    for fmt in parts:
+        part_size = fmt and (fmt.get("filesize") or fmt.get("filesize_approx"))
+        if not part_size:
+            return None
+        size += part_size
+    if len(parts) > 1 or parts[0].get("acodec") in (None, "none"):
+        # Video-only formats are merged with audio; the parts stay next to
+        # the output until the merge ends
+        size *= MERGE_FACTOR
+    return int(size)
+
+
+class Reservation:
+    def __init__(self, job_id, size):
+        self.job_id = job_id
+        self.size = size
+        self.paths = []
+        # Bytes under paths at the last measurement
+        self.written = 0
+
+    def outstanding(self):
+        """Bytes this job may still write."""
+        return max(0, self.size - self.written)
+
+
+class DiskAdmission:
+    def __init__(self, path, headroom):
+        self.path = path
+        self.headroom = headroom
+        self._reservations = {}
+        self._changed = asyncio.Event()
+        self._measured = 0.0
+        self._measuring = None
+        self.rejected = 0
+
+    def _usage(self):
+        os.makedirs(self.path, exist_ok=True)
+        return shutil.disk_usage(self.path)
+
+    @staticmethod
+    def _measure(paths):
+        return [sum(tree_size(p) for p in job_paths) for job_paths in paths]
+
+    async def _refresh(self):
+        reservations = list(self._reservations.values())
+        sizes = await asyncio.to_thread(self._measure, [list(r.paths) for r in reservations])
+        for reservation, size in zip(reservations, sizes):
+            reservation.written = size
+        self._measured = time.monotonic()
+
+    def _refreshed(self, task):
+        self._measuring = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Measuring job downloads failed: {task.exception()}")
+
+    def refresh(self):
+        """Measure what every job has written so far; concurrent callers share one walk."""
+        if self._measuring is None:
+            self._measuring = asyncio.ensure_future(self._refresh())
+            self._measuring.add_done_callback(self._refreshed)
+        return self._measuring
+
+    def _expire(self):
+        if self._reservations and time.monotonic() - self._measured > USAGE_TTL:
+            self.refresh()
+
+    def available(self):
+        """Free bytes not yet promised to a running job."""
+        self._expire()
+        outstanding = sum(r.outstanding() for r in self._reservations.values())
+        return self._usage().free - self.headroom - outstanding
+
+    def capacity(self):
+        """Most a single job could ever get: free space plus what running jobs will release."""
+        self._expire()
+        held = sum(r.written for r in self._reservations.values())
+        return self._usage().free + held - self.headroom
+
+    def check(self, size):
+        """Raise DiskFullError when size can never fit, even with every other job gone."""
+        if size and size > self.capacity():
+            self.rejected += 1
+            raise DiskFullError(
+                f"needs {size} bytes but at most {max(0, self.capacity())} can ever be free"
+            )
+
+    def try_reserve(self, job_id, size):
+        """Reserve size bytes for job_id (or grow its reservation) if they fit right now."""
+        size = size or 0
+        reservation = self._reservations.get(job_id)
+        held = reservation.size if reservation else 0
+        if size > held and size - held > self.available():
+            return False
+        if reservation is None:
+            self._reservations[job_id] = Reservation(job_id, size)
+        else:
+            reservation.size = max(held, size)
+        return True
+
+    async def reserve(self, job_id, size):
+        """Wait until size bytes fit; returns True when the caller had to wait."""
+        self.check(size)
+        waited = False
+        while not self.try_reserve(job_id, size):
+            waited = True
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), RECHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.shield(self.refresh())
+            self.check(size)
+        return waited
+
+    def track(self, job_id, path):
+        """Count bytes under path against job_id's reservation."""
+        reservation = self._reservations.get(job_id)
+        if reservation is not None and path not in reservation.paths:
+            reservation.paths.append(path)
+
+    def active_paths(self):
+        return [p for r in self._reservations.values() for p in r.paths]
+
+    def release(self, job_id):
+        """Drop job_id's reservation; returns it (or None) so callers can see its paths."""
+        reservation = self._reservations.pop(job_id, None)
+        if reservation is not None:
+            self._changed.set()
+        return reservation
+
+    def stats(self):
+        reservations = list(self._reservations.values())
+        return dict(
+            jobs=len(reservations),
+            reserved=sum(r.size for r in reservations),
+            outstanding=sum(r.outstanding() for r in reservations),
+            available=max(0, self.available()),
+            rejected=self.rejected,
+        )
+
+
+disk = DiskAdmission(Config.DOWNLOAD_LOCATION, Config.DISK_HEADROOM)
@@ -3,53 +3,59 @@ import math
 import time
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from plugins.script import Translation
-from pyrogram import enums 
+from pyrogram import enums, StopTransmission
+from plugins.functions.edits import edits
 
 
 
 
-async def progress_for_pyrogram(current, total, ud_type, message, start):
+def cancel_markup(job):
+    """Cancel button for job's progress messages (None without a job)."""
+    if job is None:
+        return None
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton('⛔ Cancel', callback_data=f"cancel_download+{job.id}")
+            ]
+        ]
+    )
+
+
+async def progress_for_pyrogram(current, total, ud_type, message, start, job=None):
+    if job is not None and job.cancelled:
+        # Pyrogram aborts the transfer when the progress callback raises this
+        raise StopTransmission
+    # Every call refreshes the latest text; the coalescer decides when to edit
     now = time.time()
-    diff = now - start
-    if round(diff % 10.00) == 0 or current == total:
-        percentage = current * 100 / total
-        speed = current / diff
-        elapsed_time = round(diff) * 1000
-        time_to_completion = round((total - current) / speed) * 1000
-        estimated_total_time = elapsed_time + time_to_completion
+    diff = max(now - start, 0.001)
+    percentage = current * 100 / total if total else 0
+    speed = current / diff
+    elapsed_time = round(diff) * 1000
+    time_to_completion = round((total - current) / speed) * 1000 if speed else 0
+    estimated_total_time = elapsed_time + time_to_completion
 
-        elapsed_time = TimeFormatter(milliseconds=elapsed_time)
-        estimated_total_time = TimeFormatter(milliseconds=estimated_total_time)
+    elapsed_time = TimeFormatter(milliseconds=elapsed_time)
+    estimated_total_time = TimeFormatter(milliseconds=estimated_total_time)
 
-        progress = "┏━━━━✦[{0}{1}]✦━━━━".format(
-            ''.join(["▣" for i in range(math.floor(percentage / 10))]),
-            ''.join(["▢" for i in range(10 - math.floor(percentage / 10))])
-        )
+    progress = "┏━━━━✦[{0}{1}]✦━━━━".format(
+        ''.join(["▣" for i in range(math.floor(percentage / 10))]),
+        ''.join(["▢" for i in range(10 - math.floor(percentage / 10))])
+    )
 
-        tmp = progress + Translation.PROGRESS.format(
-            round(percentage, 2),
-            humanbytes(current),
-            humanbytes(total),
-            humanbytes(speed),
-            estimated_total_time if estimated_total_time != '' else "0 s"
-        )
-        try:
-            await message.edit(
-              text= Translation.PROGRES.format(
-              ud_type,
-              tmp
-                ),
-                parse_mode=enums.ParseMode.HTML,
-                reply_markup=InlineKeyboardMarkup(
-                    [
-                        [ 
-                        InlineKeyboardButton('⛔ Cancel', callback_data=f"cancel_download+{id}")
-                       ]
-                   ]
-                 )
-            )
-        except:
-            pass
+    tmp = progress + Translation.PROGRESS.format(
+        round(percentage, 2),
+        humanbytes(current),
+        humanbytes(total),
+        humanbytes(speed),
+        estimated_total_time if estimated_total_time != '' else "0 s"
+    )
+    edits.submit(
+        message,
+        Translation.PROGRES.format(ud_type, tmp),
+        parse_mode=enums.ParseMode.HTML,
+        reply_markup=cancel_markup(job)
+    )
 
 
 def humanbytes(size):
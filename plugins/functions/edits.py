@@ -0,0 +1,125 @@
+# Progress message edit coalescer.
+# Progress callbacks submit the latest text for a message; one flusher sends
+# at most one edit per message per EDIT_INTERVAL, skips unchanged text and
+# keeps all messages together under EDITS_PER_SECOND.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import asyncio
+from pyrogram.errors import FloodWait, MessageNotModified
+from plugins.config import Config
+
+TICK = 0.2
+# Drop bookkeeping for messages that have not been touched for this long
+IDLE_FORGET = 15 * 60
+
+
+class EditCoalescer:
+    def __init__(self, interval, rate):
+        self.interval = interval
+        self.rate = max(0.1, rate)
+        self._pending = {}
+        self._last_text = {}
+        self._last_edit = {}
+        # key -> the edit request currently on its way to Telegram
+        self._sending = {}
+        self._tokens = self.rate
+        self._refilled = time.monotonic()
+        self._paused_until = 0
+        self._task = None
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @staticmethod
+    def _key(message):
+        return message.chat.id, message.id
+
+    def submit(self, message, text, reply_markup=None, parse_mode=None):
+        """Remember the newest text for message; the flusher decides when to send it."""
+        key = self._key(message)
+        if text == self._last_text.get(key) and key not in self._pending:
+            self.skipped += 1
+            return
+        if key in self._pending:
+            self.skipped += 1
+        self._pending[key] = (message, text, reply_markup, parse_mode)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flusher())
+
+    async def forget(self, message):
+        """Drop queued edits and wait for one in flight, e.g. right before a final status edit."""
+        key = self._key(message)
+        self._pending.pop(key, None)
+        send = self._sending.get(key)
+        if send is not None:
+            await asyncio.wait([send])
+            # A FloodWait during that send queues its text again
+            self._pending.pop(key, None)
+        self._last_text.pop(key, None)
+        self._last_edit.pop(key, None)
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def _send(self, key, message, text, reply_markup, parse_mode):
+        try:
+            # Status messages with a thumbnail only have a caption to edit
+            if message.media:
+                await message.edit_caption(text, parse_mode=parse_mode, reply_markup=reply_markup)
+            else:
+                await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+            self.sent += 1
+        except MessageNotModified:
+            self.skipped += 1
+        except FloodWait as e:
+            # Back off globally and retry the newest text afterwards
+            self._paused_until = time.monotonic() + e.value
+            self._pending.setdefault(key, (message, text, reply_markup, parse_mode))
+            return
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Progress edit failed: {e}")
+        self._last_text[key] = text
+
+    async def _flusher(self):
+        while self._pending:
+            await asyncio.sleep(TICK)
+            now = time.monotonic()
+            if now < self._paused_until:
+                continue
+            ready = sorted(
+                (k for k in self._pending if now - self._last_edit.get(k, 0) >= self.interval),
+                key=lambda k: self._last_edit.get(k, 0)
+            )
+            for key in ready:
+                if not self._take_token():
+                    break
+                message, text, reply_markup, parse_mode = self._pending.pop(key)
+                self._last_edit[key] = now
+                if text == self._last_text.get(key):
+                    self.skipped += 1
+                    continue
+                send = asyncio.ensure_future(self._send(key, message, text, reply_markup, parse_mode))
+                self._sending[key] = send
+                try:
+                    await send
+                finally:
+                    self._sending.pop(key, None)
+            for key in [k for k, t in self._last_edit.items() if now - t > IDLE_FORGET and k not in self._pending]:
+                self._last_edit.pop(key, None)
+                self._last_text.pop(key, None)
+
+    def stats(self):
+        return dict(pending=len(self._pending), sent=self.sent, skipped=self.skipped, failed=self.failed)
+
+
+edits = EditCoalescer(Config.EDIT_INTERVAL, Config.EDITS_PER_SECOND)
@@ -0,0 +1,228 @@
+# Extraction cache for yt-dlp info dicts.
+# Memory LRU tier + optional disk tier, TTL bounded by signed CDN URL expiry.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import calendar
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from plugins.config import Config
+
+# Query params that never change what yt-dlp extracts
+TRACKING_PARAMS = {
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid", "igshid", "si", "feature", "ref", "ref_src",
+}
+
+# Absolute unix-time expiry params used by signed CDN URLs
+EXPIRY_PARAMS = ("expire", "expires", "exp", "validto", "e")
+
+# Do not hand out format URLs that die before the user clicks a button
+EXPIRY_SAFETY_MARGIN = 120
+
+
+def normalize_url(url):
+    """Canonical form of a link, used as the cache identity."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS]
+
+    # youtu.be/ID and youtube.com/shorts/ID are the same video as watch?v=ID
+    if host == "youtu.be" and len(path) > 1:
+        query = [("v", path.lstrip("/"))] + [(k, v) for k, v in query if k != "t"]
+        host, path = "youtube.com", "/watch"
+    elif host in ("youtube.com", "m.youtube.com", "music.youtube.com"):
+        host = "youtube.com"
+        m = re.match(r"^/(?:shorts|live|embed)/([\w-]{6,})", path)
+        if m:
+            query = [("v", m.group(1))] + query
+            path = "/watch"
+        query = [(k, v) for k, v in query if k != "t"]
+
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+def _param_expiry(url):
+    """Earliest absolute expiry (unix time) announced by a signed URL, or None."""
+    try:
+        query = parse_qsl(urlsplit(url).query, keep_blank_values=True)
+    except ValueError:
+        return None
+    found = []
+    params = {k.lower(): v for k, v in query}
+    for name in EXPIRY_PARAMS:
+        value = params.get(name, "")
+        if value.isdigit() and len(value) >= 9:
+            found.append(int(value[:10]))
+    # S3 / GCS style relative expiry
+    amz_date = params.get("x-amz-date") or params.get("x-goog-date")
+    amz_expires = params.get("x-amz-expires") or params.get("x-goog-expires")
+    if amz_date and amz_expires and amz_expires.isdigit():
+        try:
+            signed = calendar.timegm(time.strptime(amz_date, "%Y%m%dT%H%M%SZ"))
+            found.append(signed + int(amz_expires))
+        except ValueError:
+            pass
+    # Akamai tokens: hdnts=st=...~exp=...~hmac=...
+    for name in ("hdnts", "hdnea", "__token__"):
+        m = re.search(r"exp=(\d{9,})", params.get(name, ""))
+        if m:
+            found.append(int(m.group(1)[:10]))
+    return min(found) if found else None
+
+
+def info_expiry(info):
+    """Earliest expiry among all media URLs in an info dict, or None."""
+    urls = [info.get("url")]
+    urls += [f.get("url") for f in info.get("formats") or []]
+    urls += [f.get("manifest_url") for f in info.get("formats") or []]
+    expiries = [e for e in (_param_expiry(u) for u in urls if u) if e]
+    return min(expiries) if expiries else None
+
+
+class ExtractCache:
+    def __init__(self, max_entries, ttl, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self._mem = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def profile(cookies_file=None, proxy=""):
+        """Cookies and proxy change what a site returns, so they are part of the key."""
+        cookie_tag = ""
+        if cookies_file and os.path.exists(cookies_file):
+            st = os.stat(cookies_file)
+            cookie_tag = f"{os.path.abspath(cookies_file)}:{st.st_size}:{int(st.st_mtime)}"
+        return f"{cookie_tag}|{proxy or ''}"
+
+    def key(self, url, cookies_file=None, proxy=""):
+        raw = normalize_url(url) + "#" + self.profile(cookies_file, proxy)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _ttl_for(self, info):
+        ttl = self.ttl
+        expiry = info_expiry(info)
+        if expiry:
+            ttl = min(ttl, expiry - time.time() - EXPIRY_SAFETY_MARGIN)
+        return ttl
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_read(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _disk_write(self, key, expires_at, info):
+        path = self._disk_path(key)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "info": info}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Extract cache disk write failed: {e}")
+
+    def _remember(self, key, expires_at, info):
+        self._mem[key] = (expires_at, info)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    async def get(self, url, cookies_file=None, proxy=""):
+        key = self.key(url, cookies_file, proxy)
+        entry = self._mem.get(key)
+        if entry is not None:
+            expires_at, info = entry
+            if expires_at > time.time():
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return info
+            del self._mem[key]
+            self.expired += 1
+        if self.disk_dir:
+            entry = await asyncio.to_thread(self._disk_read, key)
+            if entry is not None:
+                self._remember(key, entry["expires_at"], entry["info"])
+                self.disk_hits += 1
+                return entry["info"]
+        self.misses += 1
+        return None
+
+    async def put(self, url, info, cookies_file=None, proxy=""):
+        ttl = self._ttl_for(info)
+        if ttl <= 0:
+            return
+        key = self.key(url, cookies_file, proxy)
+        expires_at = time.time() + ttl
+        self._remember(key, expires_at, info)
+        self.stores += 1
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_write, key, expires_at, info)
+
+    def invalidate(self, url, cookies_file=None, proxy=""):
+        key = self.key(url, cookies_file, proxy)
+        self._mem.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return dict(
+            entries=len(self._mem),
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            stores=self.stores,
+            expired=self.expired,
+            hit_ratio=round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        )
+
+
+extract_cache = ExtractCache(
+    Config.EXTRACT_CACHE_SIZE,
+    Config.EXTRACT_CACHE_TTL,
+    Config.EXTRACT_CACHE_DIR
+)
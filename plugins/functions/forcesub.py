@@ -1,10 +1,130 @@
 import os
+import time
 import asyncio
+from collections import OrderedDict
 from plugins.config import Config
-from pyrogram import Client
+from pyrogram import Client, enums
 from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired, PeerIdInvalid, ChannelInvalid
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+# Statuses that count as subscribed
+JOINED = (
+    enums.ChatMemberStatus.OWNER,
+    enums.ChatMemberStatus.ADMINISTRATOR,
+    enums.ChatMemberStatus.MEMBER,
+    enums.ChatMemberStatus.RESTRICTED,
+)
+# Cached members at most; past this the entries closest to expiry go first
+MEMBERS_MAX = 50000
+
+MEMBER, NOT_MEMBER, BANNED = "member", "not_member", "banned"
+
+
+def channel_id():
+    """UPDATES_CHANNEL as an int chat id, or as a username."""
+    channel = str(Config.UPDATES_CHANNEL).strip()
+    return int(channel) if channel.lstrip("-").isdigit() else channel
+
+
+def is_updates_channel(chat):
+    channel = channel_id()
+    if isinstance(channel, int):
+        return chat.id == channel
+    return (chat.username or "").lower() == channel.lstrip("@").lower()
+
+
+class ForceSubCache:
+    """The channel invite link, and users known to be subscribed.
+
+    Only positive answers are cached: a user who just joined must not be
+    told to join again. Join and leave updates from the channel keep the
+    cache honest between checks.
+    """
+
+    def __init__(self, member_ttl, link_ttl):
+        self.member_ttl = member_ttl
+        self.link_ttl = link_ttl
+        # user_id -> expiry, oldest first (every entry gets the same TTL)
+        self._members = OrderedDict()
+        self._link = None
+        self._link_until = 0
+        self._link_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_member(self, user_id):
+        until = self._members.get(user_id)
+        if until is not None and until > time.monotonic():
+            self.hits += 1
+            return True
+        self._members.pop(user_id, None)
+        self.misses += 1
+        return False
+
+    def add(self, user_id):
+        self._members[user_id] = time.monotonic() + self.member_ttl
+        self._members.move_to_end(user_id)
+        while len(self._members) > MEMBERS_MAX:
+            self._members.popitem(last=False)
+
+    def drop(self, user_id):
+        self._members.pop(user_id, None)
+
+    async def invite_link(self, bot):
+        async with self._link_lock:
+            if self._link is None or time.monotonic() >= self._link_until:
+                try:
+                    link = await bot.create_chat_invite_link(channel_id())
+                except FloodWait:
+                    # A stale link still works; only wait when there is none
+                    if self._link is None:
+                        raise
+                else:
+                    self._link = link.invite_link
+                    self._link_until = time.monotonic() + self.link_ttl
+            return self._link
+
+    async def membership(self, bot, user_id):
+        """MEMBER, NOT_MEMBER or BANNED; errors propagate."""
+        if self.is_member(user_id):
+            return MEMBER
+        try:
+            user = await bot.get_chat_member(channel_id(), user_id)
+        except UserNotParticipant:
+            return NOT_MEMBER
+        if user.status == enums.ChatMemberStatus.BANNED:
+            return BANNED
+        if user.status in JOINED:
+            self.add(user_id)
+            return MEMBER
+        return NOT_MEMBER
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(
+            members=len(self._members),
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / total if total else 0.0,
+        )
+
+
+fsub_cache = ForceSubCache(Config.FSUB_MEMBER_TTL, Config.FSUB_LINK_TTL)
+
+
+@Client.on_chat_member_updated()
+async def track_membership(bot, update):
+    if not Config.UPDATES_CHANNEL or not is_updates_channel(update.chat):
+        return
+    member = update.new_chat_member or update.old_chat_member
+    if member is None or member.user is None:
+        return
+    if update.new_chat_member and update.new_chat_member.status in JOINED:
+        fsub_cache.add(member.user.id)
+    else:
+        fsub_cache.drop(member.user.id)
+
+
 async def handle_force_subscribe(bot, message):
     if not Config.UPDATES_CHANNEL:
         await bot.send_message(
@@ -15,37 +135,25 @@ async def handle_force_subscribe(bot, message):
         return 400
 
     try:
-        invite_link = await bot.create_chat_invite_link(int(Config.UPDATES_CHANNEL))
-    except FloodWait as e:
-        await asyncio.sleep(e.x)
-        return 400
-    except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, KeyError, ValueError) as e:
-        await bot.send_message(
-            chat_id=message.from_user.id,
-            text="Bot is not properly configured or missing access to the Updates Channel.\nPlease contact the admin!",
-            disable_web_page_preview=True,
-        )
-        return 400
-
-    try:
-        user = await bot.get_chat_member(int(Config.UPDATES_CHANNEL), message.from_user.id)
-        if user.status == "kicked":
+        status = await fsub_cache.membership(bot, message.from_user.id)
+        if status == MEMBER:
+            return
+        if status == BANNED:
             await bot.send_message(
                 chat_id=message.from_user.id,
                 text="Sorry, you are banned from using this bot.",
                 disable_web_page_preview=True,
             )
             return 400
-    except UserNotParticipant:
+        invite_link = await fsub_cache.invite_link(bot)
+    except FloodWait as e:
+        await asyncio.sleep(e.value)
+        return 400
+    except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, KeyError, ValueError) as e:
         await bot.send_message(
             chat_id=message.from_user.id,
-            text="Please join the Updates Channel to use this bot!",
-            reply_markup=InlineKeyboardMarkup(
-                [
-                    [InlineKeyboardButton("Join Channel", url=invite_link.invite_link)],
-                    [InlineKeyboardButton("Refresh", callback_data="refreshForceSub")]
-                ]
-            ),
+            text="Bot is not properly configured or missing access to the Updates Channel.\nPlease contact the admin!",
+            disable_web_page_preview=True,
         )
         return 400
     except Exception:
@@ -55,3 +163,15 @@ async def handle_force_subscribe(bot, message):
             disable_web_page_preview=True,
         )
         return 400
+
+    await bot.send_message(
+        chat_id=message.from_user.id,
+        text="Please join the Updates Channel to use this bot!",
+        reply_markup=InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton("Join Channel", url=invite_link)],
+                [InlineKeyboardButton("Refresh", callback_data="refreshForceSub")]
+            ]
+        ),
+    )
+    return 400
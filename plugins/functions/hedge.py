@@ -0,0 +1,102 @@
+# Hedged extraction: race native impersonate against the extractor-args
+# fallback. The fallback starts after HEDGE_DELAY seconds (or at once for
+# domains known to need it); the first usable info dict wins and the
+# losing worker is killed.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import asyncio
+from urllib.parse import urlsplit
+from plugins.config import Config
+from plugins.functions.ytdl_pool import extract_pool
+
+# domain -> {"primary": wins, "fallback": wins, "failed": count}
+HEDGE_STATS = {}
+
+# Domains where the fallback won last time; they race both from the start
+LEARNED_DOMAINS = set()
+
+
+def url_domain(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def needs_fallback(domain):
+    return domain in LEARNED_DOMAINS or any(
+        domain == d or domain.endswith("." + d) for d in Config.HEDGE_DOMAINS
+    )
+
+
+def _valid(info):
+    return bool(info) and bool(info.get("formats") or info.get("url"))
+
+
+def _record(domain, outcome):
+    stats = HEDGE_STATS.setdefault(domain, dict(primary=0, fallback=0, failed=0))
+    stats[outcome] += 1
+    if outcome == "fallback":
+        LEARNED_DOMAINS.add(domain)
+    elif outcome == "primary":
+        LEARNED_DOMAINS.discard(domain)
+
+
+async def hedged_extract(url, primary_args, fallback_args):
+    """Info dict from whichever strategy answers first with something usable."""
+    domain = url_domain(url)
+    strategies = {"primary": primary_args, "fallback": fallback_args}
+    running = {}
+
+    def launch(name):
+        logger.info(f"🏁 Hedge {name} for {domain}")
+        task = asyncio.create_task(extract_pool.extract(strategies[name], url))
+        running[task] = name
+
+    launch("primary")
+    fallback_started = False
+    if needs_fallback(domain) or Config.HEDGE_DELAY <= 0:
+        launch("fallback")
+        fallback_started = True
+
+    loop = asyncio.get_running_loop()
+    hedge_at = loop.time() + Config.HEDGE_DELAY
+    error = None
+    try:
+        while running or not fallback_started:
+            if not fallback_started and (not running or loop.time() >= hedge_at):
+                launch("fallback")
+                fallback_started = True
+            timeout = None if fallback_started else max(0, hedge_at - loop.time())
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                try:
+                    info = task.result()
+                except Exception as e:
+                    logger.warning(f"⚠️ Hedge {name} failed: {e}")
+                    error = e
+                    continue
+                if _valid(info):
+                    _record(domain, name)
+                    logger.info(f"✅ Hedge winner for {domain}: {name}")
+                    return info
+                error = RuntimeError("yt-dlp returned no formats")
+    finally:
+        # Cancelling the task kills the worker process still extracting
+        for task in running:
+            task.cancel()
+    _record(domain, "failed")
+    raise error or RuntimeError("Extraction failed")
+
+
+def hedge_summary():
+    totals = dict(primary=0, fallback=0, failed=0)
+    for stats in HEDGE_STATS.values():
+        for k in totals:
+            totals[k] += stats[k]
+    fallback_domains = sorted(
+        ((d, s["fallback"]) for d, s in HEDGE_STATS.items() if s["fallback"]),
+        key=lambda x: -x[1]
+    )
+    return totals, fallback_domains[:5]
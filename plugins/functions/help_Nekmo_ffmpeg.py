@@ -6,55 +6,113 @@ logger = logging.getLogger(__name__)
 
 
 import asyncio
+import hashlib
 import os
+import signal
 import time
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# Scaled watermarks kept, one per width
+WATERMARK_CACHE_SIZE = 32
 
-async def place_water_mark(input_file, output_file, water_mark_file):
-    watermarked_file = output_file + "@UploaderXNTBot"
-    metadata = extractMetadata(createParser(input_file))
-    width = metadata.get("width")
-    # https://stackoverflow.com/a/34547184/4723940
-    shrink_watermark_file_genertor_command = [
-        "ffmpeg",
-        "-i", water_mark_file,
-        "-y -v quiet",
-        "-vf",
-        "scale={}*0.5:-1".format(width),
-        watermarked_file
-    ]
-    # print(shrink_watermark_file_genertor_command)
-    process = await asyncio.create_subprocess_exec(
-        *shrink_watermark_file_genertor_command,
-        # stdout must a pipe to be accessible as process.stdout
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    # Wait for the subprocess to finish
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
-    commands_to_execute = [
-        "ffmpeg",
-        "-i", input_file,
-        "-i", watermarked_file,
-        "-filter_complex",
-        "\"overlay=(main_w-overlay_w):(main_h-overlay_h)\"",
-        output_file
-    ]
-    # print(commands_to_execute)
+
+async def run_command(command):
+    """Run command to completion; a cancelled caller kills its whole process group."""
     process = await asyncio.create_subprocess_exec(
-        *commands_to_execute,
+        *command,
         # stdout must a pipe to be accessible as process.stdout
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
-    # Wait for the subprocess to finish
-    stdout, stderr = await process.communicate()
+    try:
+        # Wait for the subprocess to finish
+        return await process.communicate()
+    except asyncio.CancelledError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+
+
+def watermark_dir():
+    """Where watermarks scaled for a given width are kept between runs."""
+    from plugins.config import Config
+    return os.path.join(Config.DOWNLOAD_LOCATION, "watermarks")
+
+
+def _scaled_watermark(water_mark_file, width):
+    st = os.stat(water_mark_file)
+    key = hashlib.sha256(f"{os.path.abspath(water_mark_file)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    return os.path.join(watermark_dir(), f"{key}_{width}.png")
+
+
+def _evict_watermarks():
+    directory = watermark_dir()
+    paths = [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".png")]
+    paths.sort(key=lambda p: os.stat(p).st_mtime)
+    for p in paths[:max(0, len(paths) - WATERMARK_CACHE_SIZE)]:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+async def place_water_mark(input_file, output_file, water_mark_file, width=None):
+    """Overlay water_mark_file, scaled to half the input width, at the bottom right.
+
+    Works for images and videos with one ffmpeg run. The first run for a
+    width also writes the scaled watermark to the cache; later runs overlay
+    the cached file without scaling again.
+    """
+    if width is None:
+        from plugins.functions.metadata import metadata
+        width = (await metadata.probe(input_file, need=("width",)))["width"]
+    # https://stackoverflow.com/a/34547184/4723940
+    target = max(1, int(width * 0.5)) if width else None
+    scaled = _scaled_watermark(water_mark_file, target) if target else None
+    overlay = "overlay=main_w-overlay_w:main_h-overlay_h"
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", input_file]
+    cached = False
+    if scaled is not None:
+        try:
+            # mtime doubles as the LRU clock; a concurrent eviction just means
+            # this run scales and caches it again
+            os.utime(scaled)
+            cached = True
+        except FileNotFoundError:
+            pass
+    if cached:
+        command += ["-i", scaled, "-filter_complex", f"[0:v][1:v]{overlay}[out]"]
+        cache_tmp = None
+    elif scaled is not None:
+        os.makedirs(watermark_dir(), exist_ok=True)
+        cache_tmp = f"{scaled}.{os.getpid()}.{time.time_ns()}.png"
+        command += ["-i", water_mark_file, "-filter_complex",
+                    f"[1:v]scale={target}:-1,split=2[wm][keep];[0:v][wm]{overlay}[out]"]
+    else:
+        # Unknown width: scale against the input inside the graph, nothing to cache
+        cache_tmp = None
+        command += ["-i", water_mark_file, "-filter_complex",
+                    f"[1:v][0:v]scale2ref=w=main_w/2:h=ow/a[wm][base];[base][wm]{overlay}[out]"]
+    command += ["-map", "[out]"]
+    if output_file.lower().endswith(IMAGE_EXTENSIONS):
+        command += ["-frames:v", "1", "-q:v", "2"]
+    else:
+        command += ["-map", "0:a?", "-c:a", "copy", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+                    "-movflags", "+faststart"]
+    command.append(output_file)
+    if cache_tmp is not None:
+        command += ["-map", "[keep]", "-frames:v", "1", cache_tmp]
+    stdout, stderr = await run_command(command)
     e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
+    if e_response:
+        logger.debug(e_response)
+    if cache_tmp is not None and os.path.exists(cache_tmp):
+        os.replace(cache_tmp, scaled)
+        _evict_watermarks()
     return output_file
 
 
@@ -73,14 +131,7 @@ async def take_screen_shot(video_file, output_directory, ttl):
         out_put_file_name
     ]
     # width = "90"
-    process = await asyncio.create_subprocess_exec(
-        *file_genertor_command,
-        # stdout must a pipe to be accessible as process.stdout
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    # Wait for the subprocess to finish
-    stdout, stderr = await process.communicate()
+    stdout, stderr = await run_command(file_genertor_command)
     e_response = stderr.decode().strip()
     t_response = stdout.decode().strip()
     if os.path.lexists(out_put_file_name):
@@ -106,14 +157,7 @@ async def cult_small_video(video_file, output_directory, start_time, end_time):
         "-2",
         out_put_file_name
     ]
-    process = await asyncio.create_subprocess_exec(
-        *file_genertor_command,
-        # stdout must a pipe to be accessible as process.stdout
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    # Wait for the subprocess to finish
-    stdout, stderr = await process.communicate()
+    stdout, stderr = await run_command(file_genertor_command)
     e_response = stderr.decode().strip()
     t_response = stdout.decode().strip()
     if os.path.lexists(out_put_file_name):
@@ -121,6 +165,29 @@ async def cult_small_video(video_file, output_directory, start_time, end_time):
     else:
         return None
 
+async def take_screen_shots(video_file, output_directory, timestamps):
+    """One keyframe near each timestamp, all from a single ffmpeg process.
+
+    Every timestamp is a separate input seek, and only keyframes are decoded
+    (-skip_frame nokey), so the cost does not grow with the video length.
+    Returns the paths that were actually written, in timestamp order.
+    """
+    stamp = str(time.time())
+    outputs = [os.path.join(output_directory, f"{stamp}_{i}.jpg") for i in range(len(timestamps))]
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    for ttl in timestamps:
+        command += ["-skip_frame", "nokey", "-noaccurate_seek", "-ss", str(ttl), "-i", video_file]
+    for i, out_put_file_name in enumerate(outputs):
+        command += ["-map", f"{i}:v:0", "-frames:v", "1", "-q:v", "2", out_put_file_name]
+    started = time.monotonic()
+    stdout, stderr = await run_command(command)
+    logger.info(f"{len(timestamps)} screenshots in {time.monotonic() - started:.2f}s from {video_file}")
+    e_response = stderr.decode().strip()
+    if e_response:
+        logger.debug(e_response)
+    return [f for f in outputs if os.path.lexists(f)]
+
+
 # ©️ LISA-KOREA | @LISA_FAN_LK | NT_BOT_CHANNEL
 async def generate_screen_shots(
     video_file,
@@ -128,25 +195,67 @@ async def generate_screen_shots(
     is_watermarkable,
     wf,
     min_duration,
-    no_of_photos
+    no_of_photos,
+    duration=None
 ):
-    metadata = extractMetadata(createParser(video_file))
-    duration = 0
-    if metadata is not None:
-        if metadata.has("duration"):
-            duration = metadata.get('duration').seconds
+    if duration is None:
+        from plugins.functions.metadata import metadata
+        duration = (await metadata.probe(video_file, need=("duration",)))["duration"]
     if duration > min_duration:
-        images = []
-        ttl_step = duration // no_of_photos
-        current_ttl = ttl_step
-        for looper in range(0, no_of_photos):
-            ss_img = await take_screen_shot(video_file, output_directory, current_ttl)
-            current_ttl = current_ttl + ttl_step
-            if is_watermarkable:
-                ss_img = await place_water_mark(ss_img, output_directory + "/" + str(time.time()) + ".jpg", wf)
-            images.append(ss_img)
+        # Evenly spaced, away from the very start and end
+        ttl_step = duration / no_of_photos
+        timestamps = [round(ttl_step * (i + 0.5), 2) for i in range(no_of_photos)]
+        images = await take_screen_shots(video_file, output_directory, timestamps)
+        if is_watermarkable:
+            # Frames share the video's width, so the scaled watermark is reused
+            from plugins.functions.metadata import metadata
+            width = (await metadata.probe(video_file, need=("width",)))["width"] or None
+            images = [
+                await place_water_mark(ss_img, output_directory + "/" + str(time.time()) + ".jpg", wf, width)
+                for ss_img in images
+            ]
         return images
     else:
         return None
 
 
+async def send_screen_shots(bot, chat_id, images, reply_to_message_id=None):
+    """Send images as media groups (Telegram allows 10 per album)."""
+    from pyrogram.types import InputMediaPhoto
+    sent = []
+    for i in range(0, len(images), 10):
+        group = [InputMediaPhoto(image) for image in images[i:i + 10]]
+        if len(group) == 1:
+            sent.append(await bot.send_photo(chat_id, images[i], reply_to_message_id=reply_to_message_id))
+        else:
+            sent.extend(await bot.send_media_group(chat_id, group, reply_to_message_id=reply_to_message_id))
+    return sent
+
+
+async def _bench(video_file, no_of_photos):
+    import tempfile
+    stdout, stderr = await run_command([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_file
+    ])
+    duration = float(stdout.decode().strip())
+    ttl_step = duration / no_of_photos
+    timestamps = [round(ttl_step * (i + 0.5), 2) for i in range(no_of_photos)]
+    with tempfile.TemporaryDirectory() as one_by_one, tempfile.TemporaryDirectory() as single_pass:
+        started = time.monotonic()
+        for ttl in timestamps:
+            await take_screen_shot(video_file, one_by_one, ttl)
+        old = time.monotonic() - started
+        started = time.monotonic()
+        images = await take_screen_shots(video_file, single_pass, timestamps)
+        new = time.monotonic() - started
+    print(f"{no_of_photos} screenshots of {duration:.0f}s video")
+    print(f"  one ffmpeg per frame: {old:.2f}s")
+    print(f"  single pass:          {new:.2f}s ({len(images)} written, {old / max(new, 1e-6):.1f}x)")
+
+
+if __name__ == "__main__":
+    # python -m plugins.functions.help_Nekmo_ffmpeg video.mp4 [no_of_photos]
+    import sys
+    asyncio.run(_bench(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10))
+
+
@@ -0,0 +1,73 @@
+# One pooled aiohttp session for small API calls (shortlinks, redirects).
+# Connections are kept alive and DNS answers cached, so repeated calls to
+# the same host skip the TCP/TLS handshake. GETs are idempotent and retried
+# on connection errors, timeouts and 5xx/429 answers.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import asyncio
+import aiohttp
+from plugins.config import Config
+
+RETRIES = 3
+# Backoff before retry n is BACKOFF * 2 ** n seconds
+BACKOFF = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(self, limit, limit_per_host, timeout, dns_ttl=300, keepalive=30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self._session = None
+        self.requests = 0
+        self.retries = 0
+
+    def session(self):
+        """The shared session, created on first use inside the running loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=min(5, self.timeout)),
+            )
+        return self._session
+
+    async def get_json(self, url, params=None, content_type="application/json", **kwargs):
+        """GET url and decode JSON, retrying transient failures.
+
+        Other 4xx answers raise aiohttp.ClientResponseError right away.
+        """
+        for attempt in range(RETRIES + 1):
+            self.requests += 1
+            try:
+                async with self.session().get(url, params=params, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < RETRIES:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status
+                        )
+                    response.raise_for_status()
+                    return await response.json(content_type=content_type)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+                if not retryable or attempt == RETRIES:
+                    raise
+                self.retries += 1
+                logger.info(f"Retrying GET {url} after {e!r}")
+                await asyncio.sleep(BACKOFF * 2 ** attempt)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+http = HttpClient(Config.HTTP_POOL_SIZE, Config.HTTP_PER_HOST, Config.HTTP_TIMEOUT)
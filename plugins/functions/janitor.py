@@ -0,0 +1,164 @@
+# Background janitor for DOWNLOAD_LOCATION.
+# Per-job temp dirs left behind by crash paths, dl_button per-user folders,
+# leftover thumbnails and expired sessions are removed once they are older than
+# JANITOR_MAX_AGE, oldest first when the folder is over JANITOR_MAX_BYTES.
+# Anything belonging to a running job is left alone.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import shutil
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from plugins.config import Config
+from plugins.functions.disk import disk
+from plugins.functions.scheduler import scheduler
+from plugins.functions.sessions import sessions
+from plugins.functions.thumbs import thumbs
+from plugins.functions.help_Nekmo_ffmpeg import watermark_dir
+
+# Entries touched this close to (or after) the protected-paths snapshot may
+# belong to a job that started since; they wait for the next sweep
+SNAPSHOT_GRACE = 60
+
+
+def _low_priority():
+    # Idle I/O class and lowest CPU priority, for the janitor thread only
+    try:
+        import psutil
+        psutil.Process(threading.get_native_id()).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except Exception as e:
+        logger.debug(f"Janitor ionice unavailable: {e}")
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _scan(path):
+    """(bytes, newest mtime) of a file or directory tree."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0, 0
+    if not os.path.isdir(path):
+        return st.st_size, st.st_mtime
+    size, newest = 0, st.st_mtime
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            newest = max(newest, st.st_mtime)
+            if not os.path.isdir(os.path.join(root, name)):
+                size += st.st_size
+    return size, newest
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class Janitor:
+    def __init__(self, root, interval, max_age, max_bytes):
+        self.root = root
+        self.interval = interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="janitor", initializer=_low_priority)
+        self._task = None
+        self.runs = 0
+        self.removed = 0
+        self.reclaimed = 0
+        self.last_run = None
+        self.last_reclaimed = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    def _protected(self):
+        """Paths and user-id prefixes that belong to running jobs or stores."""
+        paths = {os.path.abspath(p) for p in disk.active_paths()}
+        for store in (sessions.persist_dir, Config.EXTRACT_CACHE_DIR, thumbs.root, watermark_dir()):
+            if store:
+                paths.add(os.path.abspath(store))
+        return paths, {str(u) for u in scheduler.active_users()}
+
+    def _sweep(self, protected_paths, active_users, snapshot):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.abspath(os.path.join(self.root, name))
+            if any(p == path or p.startswith(path + os.sep) or path.startswith(p + os.sep) for p in protected_paths):
+                continue
+            if any(name.startswith(u) for u in active_users):
+                continue
+            size, newest = _scan(path)
+            entries.append((newest, size, path))
+
+        freed = removed = 0
+        total = sum(size for _, size, _ in entries)
+        # Oldest first: expired entries always go, fresh ones only to meet the quota
+        for newest, size, path in sorted(entries):
+            if newest > snapshot - SNAPSHOT_GRACE:
+                # Counts toward the quota but is never removed this sweep
+                break
+            expired = now - newest > self.max_age
+            over_quota = self.max_bytes and total > self.max_bytes
+            if not expired and not over_quota:
+                break
+            _remove(path)
+            logger.info(f"🧹 Removed {path} ({size} bytes, {'expired' if expired else 'over quota'})")
+            freed += size
+            total -= size
+            removed += 1
+        return freed, removed
+
+    async def run_once(self):
+        """One sweep; returns the bytes reclaimed."""
+        await sessions.sweep()
+        if not os.path.isdir(self.root):
+            return 0
+        snapshot = time.time()
+        protected_paths, active_users = self._protected()
+        loop = asyncio.get_running_loop()
+        freed, removed = await loop.run_in_executor(
+            self._executor, self._sweep, protected_paths, active_users, snapshot
+        )
+        self.runs += 1
+        self.removed += removed
+        self.reclaimed += freed
+        self.last_reclaimed = freed
+        self.last_run = time.time()
+        return freed
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Janitor sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return dict(
+            runs=self.runs,
+            removed=self.removed,
+            reclaimed=self.reclaimed,
+            last_reclaimed=self.last_reclaimed,
+            last_run=self.last_run,
+        )
+
+
+janitor = Janitor(Config.DOWNLOAD_LOCATION, Config.JANITOR_INTERVAL, Config.JANITOR_MAX_AGE, Config.JANITOR_MAX_BYTES)
@@ -0,0 +1,175 @@
+# Media metadata, probed at most once per file. ffprobe (JSON) runs as a
+# subprocess; if it is missing or fails, hachoir runs in a small worker pool
+# instead of on the event loop. Results are cached by (path, size, mtime), and
+# callers that already know the values from yt-dlp skip probing entirely.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import struct
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from plugins.config import Config
+from plugins.functions.help_Nekmo_ffmpeg import run_command
+
+FIELDS = ("width", "height", "duration", "vcodec", "acodec", "moov_offset", "faststart")
+# Top-level MP4 boxes that may come before moov
+MP4_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"uuid", b"pdin", b"moof", b"mfra", b"meta"}
+
+
+def empty():
+    return dict(width=0, height=0, duration=0, vcodec=None, acodec=None, moov_offset=None, faststart=None)
+
+
+def moov_position(path):
+    """(offset of the moov box, whether it precedes mdat), or (None, None) for non-MP4 files."""
+    with open(path, "rb") as f:
+        total = os.fstat(f.fileno()).st_size
+        offset = 0
+        mdat_seen = False
+        while offset + 8 <= total:
+            f.seek(offset)
+            size, kind = struct.unpack(">I4s", f.read(8))
+            if kind not in MP4_BOXES:
+                break
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = total - offset
+            if size < 8:
+                break
+            if kind == b"moov":
+                return offset, not mdat_seen
+            if kind == b"mdat":
+                mdat_seen = True
+            offset += size
+    return None, None
+
+
+def parse_ffprobe(output):
+    data = json.loads(output)
+    meta = empty()
+    duration = (data.get("format") or {}).get("duration")
+    for stream in data.get("streams") or []:
+        kind = stream.get("codec_type")
+        if kind == "video" and meta["vcodec"] is None and not (stream.get("disposition") or {}).get("attached_pic"):
+            meta["vcodec"] = stream.get("codec_name")
+            meta["width"] = stream.get("width") or 0
+            meta["height"] = stream.get("height") or 0
+            rotation = (stream.get("tags") or {}).get("rotate")
+            for side_data in stream.get("side_data_list") or []:
+                rotation = side_data.get("rotation", rotation)
+            # Phones store portrait video as rotated landscape
+            if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+                meta["width"], meta["height"] = meta["height"], meta["width"]
+            duration = duration or stream.get("duration")
+        elif kind == "audio" and meta["acodec"] is None:
+            meta["acodec"] = stream.get("codec_name")
+            duration = duration or stream.get("duration")
+    meta["duration"] = int(float(duration)) if duration else 0
+    return meta
+
+
+def hachoir_probe(path):
+    from hachoir.metadata import extractMetadata
+    from hachoir.parser import createParser
+    meta = empty()
+    parser = createParser(path)
+    if parser is None:
+        return meta
+    with parser:
+        metadata = extractMetadata(parser)
+    if metadata is not None:
+        if metadata.has("duration"):
+            meta["duration"] = int(metadata.get("duration").total_seconds())
+        if metadata.has("width"):
+            meta["width"] = metadata.get("width")
+        if metadata.has("height"):
+            meta["height"] = metadata.get("height")
+    return meta
+
+
+class MetadataService:
+    def __init__(self, workers, max_entries):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="probe")
+        self._sem = asyncio.Semaphore(max(1, workers))
+        self._cache = OrderedDict()
+        self._pending = {}
+        self.probes = 0
+        self.hits = 0
+        self.skipped = 0
+
+    async def _ffprobe(self, path):
+        stdout, stderr = await run_command([
+            "ffprobe", "-v", "error", "-print_format", "json",
+            "-show_format", "-show_streams", path,
+        ])
+        return parse_ffprobe(stdout.decode(errors="replace"))
+
+    async def _probe(self, path, key):
+        loop = asyncio.get_running_loop()
+        async with self._sem:
+            self.probes += 1
+            try:
+                meta = await self._ffprobe(path)
+            except Exception as e:
+                logger.info(f"ffprobe failed for {path}, using hachoir: {e}")
+                meta = None
+            if meta is None or not (meta["duration"] or meta["width"]):
+                try:
+                    meta = await loop.run_in_executor(self._executor, hachoir_probe, path)
+                except Exception as e:
+                    logger.warning(f"hachoir failed for {path}: {e}")
+                    meta = meta or empty()
+            try:
+                meta["moov_offset"], meta["faststart"] = await loop.run_in_executor(self._executor, moov_position, path)
+            except (OSError, struct.error):
+                pass
+        self._cache[key] = meta
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return meta
+
+    async def probe(self, path, known=None, need=("width", "height", "duration")):
+        """Metadata dict (see FIELDS) for path; missing values are 0 / None.
+
+        If known (e.g. from the yt-dlp info dict) already has every field in
+        need, the file is not read at all.
+        """
+        known = {k: v for k, v in (known or {}).items() if v}
+        if all(k in known for k in need):
+            self.skipped += 1
+            meta = empty()
+            meta.update(known)
+            meta["duration"] = int(meta["duration"] or 0)
+            return meta
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        meta = self._cache.get(key)
+        if meta is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._probe(path, key))
+                self._pending[key] = task
+                task.add_done_callback(lambda _: self._pending.pop(key, None))
+            meta = await asyncio.shield(task)
+        meta = dict(meta)
+        # yt-dlp's values win where the probe found nothing
+        for k, v in known.items():
+            if not meta.get(k):
+                meta[k] = v
+        meta["duration"] = int(meta["duration"] or 0)
+        return meta
+
+    def stats(self):
+        return dict(probes=self.probes, hits=self.hits, skipped=self.skipped, entries=len(self._cache))
+
+
+metadata = MetadataService(Config.PROBE_WORKERS, Config.METADATA_CACHE_SIZE)
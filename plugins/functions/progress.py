@@ -0,0 +1,71 @@
+# Typed download progress events with a small publish/subscribe hub.
+# yt-dlp workers report through in-process progress hooks (no stdout
+# scraping); any module can subscribe to one job or to all of them.
+
+import logging
+logger = logging.getLogger(__name__)
+
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    job_id: str
+    status: str
+    downloaded: int = 0
+    total: Optional[int] = None
+    speed: Optional[float] = None
+    eta: Optional[int] = None
+    fragment_index: Optional[int] = None
+    fragment_count: Optional[int] = None
+    filename: Optional[str] = None
+
+    @property
+    def percent(self) -> Optional[float]:
+        if self.total:
+            return min(100.0, self.downloaded * 100 / self.total)
+        if self.fragment_count and self.fragment_index:
+            return min(100.0, self.fragment_index * 100 / self.fragment_count)
+        return None
+
+    @classmethod
+    def from_hook(cls, job_id: str, d: dict) -> "ProgressEvent":
+        """Build from a yt-dlp progress hook dict."""
+        return cls(
+            job_id=job_id,
+            status=d.get("status") or "downloading",
+            downloaded=int(d.get("downloaded_bytes") or 0),
+            total=d.get("total_bytes") or d.get("total_bytes_estimate"),
+            speed=d.get("speed"),
+            eta=d.get("eta"),
+            fragment_index=d.get("fragment_index"),
+            fragment_count=d.get("fragment_count"),
+            filename=d.get("filename"),
+        )
+
+
+# job_id (None = every job) -> callbacks
+_subscribers = {}
+
+
+def subscribe(callback: Callable[[ProgressEvent], None], job_id: Optional[str] = None):
+    """Call callback for each event of job_id (or all jobs); returns an unsubscribe function."""
+    _subscribers.setdefault(job_id, []).append(callback)
+
+    def unsubscribe():
+        callbacks = _subscribers.get(job_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            _subscribers.pop(job_id, None)
+
+    return unsubscribe
+
+
+def publish(event: ProgressEvent):
+    for callback in _subscribers.get(event.job_id, []) + _subscribers.get(None, []):
+        try:
+            callback(event)
+        except Exception as e:
+            logger.warning(f"Progress subscriber failed: {e}")
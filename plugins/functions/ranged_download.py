@@ -0,0 +1,209 @@
+# Multi-connection HTTP downloader for direct links.
+# Servers that answer a Range request with 206 get split across several
+# connections; each one fills large reusable buffers that are written with
+# os.pwrite in a thread. Everything else falls back to one stream.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import asyncio
+import aiohttp
+from plugins.config import Config
+
+# Don't split files smaller than this per connection
+MIN_SEGMENT = 4 * 1024 * 1024
+RETRIES = 5
+CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)")
+
+
+class RangedDownloadError(Exception):
+    pass
+
+
+class _Writer:
+    """Double-buffered positional writer: one buffer fills while the other is written."""
+
+    def __init__(self, fd, offset, buffer_size):
+        self.fd = fd
+        self.offset = offset
+        self.buffers = [bytearray(buffer_size), bytearray(buffer_size)]
+        self.current = 0
+        self.filled = 0
+        self.pending = None
+
+    async def _wait(self):
+        if self.pending is not None:
+            # A cancelled caller must not lose track of a pwrite still running in its thread
+            await asyncio.shield(self.pending)
+            self.pending = None
+
+    @staticmethod
+    def _pwrite_all(fd, view, offset):
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    async def _flush(self):
+        if not self.filled:
+            return
+        await self._wait()
+        view = memoryview(self.buffers[self.current])[:self.filled]
+        self.pending = asyncio.ensure_future(asyncio.to_thread(self._pwrite_all, self.fd, view, self.offset))
+        self.offset += self.filled
+        self.current ^= 1
+        self.filled = 0
+
+    async def write(self, chunk):
+        view = memoryview(chunk)
+        while view:
+            buf = self.buffers[self.current]
+            n = min(len(buf) - self.filled, len(view))
+            buf[self.filled:self.filled + n] = view[:n]
+            self.filled += n
+            view = view[n:]
+            if self.filled == len(buf):
+                await self._flush()
+
+    async def close(self):
+        await self._flush()
+        await self._wait()
+
+
+class RangedDownload:
+    def __init__(self, session, url, path, connections=None, progress=None, on_length=None, reserve=None):
+        self.session = session
+        self.url = url
+        self.path = path
+        self.connections = connections or Config.DDL_CONNECTIONS
+        self.progress = progress
+        self.on_length = on_length
+        # async reserve(total) -> True if it had to wait for disk space
+        self.reserve = reserve
+        self.total = None
+        self.downloaded = 0
+        self.segmented = False
+        self._writers = []
+
+    def _tick(self, n):
+        self.downloaded += n
+        if self.progress is not None:
+            self.progress(self.downloaded, self.total)
+
+    async def _drain(self):
+        """Wait for every pwrite still in flight; fd must stay open until then."""
+        pending = [w.pending for w in self._writers if w.pending is not None]
+        if pending:
+            await asyncio.wait(pending)
+
+    async def _pump(self, response, fd, state, end=None):
+        """Copy response body into fd at state["offset"], advancing it as bytes land."""
+        writer = _Writer(fd, state["offset"], Config.DDL_BUFFER_SIZE)
+        self._writers.append(writer)
+        try:
+            async for chunk in response.content.iter_chunked(Config.CHUNK_SIZE):
+                if end is not None and state["offset"] + len(chunk) > end + 1:
+                    chunk = chunk[:end + 1 - state["offset"]]
+                await writer.write(chunk)
+                state["offset"] += len(chunk)
+                self._tick(len(chunk))
+                if end is not None and state["offset"] > end:
+                    break
+        finally:
+            # Buffered bytes are counted already, so they must reach the disk
+            await writer.close()
+
+    async def _segment(self, fd, start, end, response=None):
+        state = {"offset": start}
+        for attempt in range(RETRIES):
+            try:
+                if response is None:
+                    response = await self.session.get(
+                        self.url,
+                        headers={"Range": f"bytes={state['offset']}-{end}"},
+                        timeout=aiohttp.ClientTimeout(sock_read=60)
+                    )
+                async with response:
+                    if response.status != 206:
+                        raise RangedDownloadError(f"range request answered with HTTP {response.status}")
+                    await self._pump(response, fd, state, end)
+                if state["offset"] > end:
+                    return
+                raise RangedDownloadError(f"segment ended at {state['offset']} of {end}")
+            except (aiohttp.ClientError, asyncio.TimeoutError, RangedDownloadError) as e:
+                response = None
+                if attempt == RETRIES - 1:
+                    raise
+                logger.info(f"Segment {start}-{end} retry {attempt + 1} at {state['offset']}: {e}")
+                await asyncio.sleep(1 + attempt)
+
+    async def _segmented(self, fd, first):
+        segments = min(self.connections, max(1, self.total // MIN_SEGMENT))
+        size = -(-self.total // segments)
+        bounds = [(i * size, min(self.total, (i + 1) * size) - 1) for i in range(segments)]
+        # The probe response already streams from byte 0; it serves segment 0
+        tasks = [asyncio.create_task(self._segment(fd, *bounds[0], response=first))]
+        tasks += [asyncio.create_task(self._segment(fd, *b)) for b in bounds[1:]]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled segments flush their buffers before fd closes
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        """Download to path; returns the number of bytes, or None for a tiny text response."""
+        part = self.path + ".part"
+        response = await self.session.get(
+            self.url,
+            headers={"Range": "bytes=0-"},
+            timeout=aiohttp.ClientTimeout(total=Config.PROCESS_MAX_TIMEOUT, sock_read=60)
+        )
+        match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+        if response.status == 206 and match:
+            self.total = int(match.group(3))
+        elif response.status == 200 and response.headers.get("Content-Length"):
+            self.total = int(response.headers["Content-Length"])
+        else:
+            response.raise_for_status()
+        if "text" in response.headers.get("Content-Type", "") and (self.total or 0) < 500:
+            response.release()
+            return None
+        if self.reserve is not None and self.total and await self.reserve(self.total):
+            # The probe connection sat idle while waiting for space; start over
+            response.release()
+            return await self.run()
+        if self.on_length is not None:
+            self.on_length(self.total)
+
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Sequential writes unless the server really serves ranges
+            self.segmented = bool(match) and self.connections > 1 and self.total >= 2 * MIN_SEGMENT
+            if self.segmented:
+                await asyncio.to_thread(os.ftruncate, fd, self.total)
+                await self._segmented(fd, response)
+            else:
+                async with response:
+                    await self._pump(response, fd, {"offset": 0})
+        except BaseException:
+            await self._drain()
+            os.close(fd)
+            fd = None
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            raise
+        finally:
+            if fd is not None:
+                await self._drain()
+                os.close(fd)
+        if self.total and self.downloaded < self.total:
+            os.remove(part)
+            raise RangedDownloadError(f"download ended at {self.downloaded} of {self.total} bytes")
+        os.replace(part, self.path)
+        return self.downloaded
@@ -0,0 +1,121 @@
+# Async CDN redirect resolver. Does what impersonate_final_url does (curl-
+# impersonate-chrome -I -L, last Location header wins) in a subprocess the
+# event loop awaits, with a hard timeout and a cap on concurrent curls.
+# Final URLs are cached briefly so the button click reuses the echo step's
+# answer, and concurrent lookups of one URL share a single curl.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import signal
+import asyncio
+from collections import OrderedDict, deque
+from plugins.config import Config
+
+CACHE_MAX = 1000
+# Latency samples kept for the percentiles in stats()
+SAMPLES = 200
+# curl's exit code when --max-time runs out
+CURL_TIMEOUT = 28
+
+
+def final_location(headers, url):
+    final_url = url
+    for line in headers.split("\n"):
+        if line.lower().startswith("location:"):
+            final_url = line.split(":", 1)[1].strip()
+    return final_url
+
+
+class RedirectResolver:
+    def __init__(self, timeout, concurrency, ttl):
+        self.timeout = timeout
+        self.ttl = ttl
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._cache = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.resolved = 0
+        self.timeouts = 0
+        self.failed = 0
+        self._latency = deque(maxlen=SAMPLES)
+
+    async def _curl(self, url):
+        proc = await asyncio.create_subprocess_exec(
+            "curl-impersonate-chrome", "-I", "-L", "--max-time", str(self.timeout), url,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), self.timeout + 1)
+        except BaseException:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+        # Partial headers from a failed curl are not an answer
+        if proc.returncode == CURL_TIMEOUT:
+            raise asyncio.TimeoutError()
+        if proc.returncode != 0:
+            raise RuntimeError(f"curl exited with code {proc.returncode}")
+        return final_location(stdout.decode(errors="replace"), url)
+
+    async def _resolve(self, url):
+        async with self._sem:
+            start = time.monotonic()
+            try:
+                final_url = await self._curl(url)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logger.warning(f"Redirect lookup timed out after {self.timeout}s: {url}")
+                return url
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Redirect lookup failed for {url}: {e}")
+                return url
+            finally:
+                self._latency.append(time.monotonic() - start)
+        self.resolved += 1
+        self._cache[url] = (final_url, time.monotonic() + self.ttl)
+        while len(self._cache) > CACHE_MAX:
+            self._cache.popitem(last=False)
+        return final_url
+
+    async def resolve(self, url):
+        """The final URL after redirects, or url itself if the lookup fails."""
+        cached = self._cache.get(url)
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                self.hits += 1
+                self._cache.move_to_end(url)
+                return cached[0]
+            del self._cache[url]
+        task = self._pending.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(url))
+            self._pending[url] = task
+            task.add_done_callback(lambda _: self._pending.pop(url, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        samples = sorted(self._latency)
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+        return dict(
+            resolved=self.resolved,
+            hits=self.hits,
+            timeouts=self.timeouts,
+            failed=self.failed,
+            p50=percentile(0.5),
+            p95=percentile(0.95),
+        )
+
+
+redirects = RedirectResolver(Config.REDIRECT_TIMEOUT, Config.REDIRECT_CONCURRENCY, Config.REDIRECT_CACHE_TTL)
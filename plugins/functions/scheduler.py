@@ -0,0 +1,257 @@
+# Global download/upload job scheduler.
+# Callback handlers only enqueue; jobs start when a network slot frees up,
+# picked round-robin between users so one heavy user cannot starve the rest.
+# Jobs with an announced size also wait until the disk can hold them.
+# Every job id doubles as its cancel token (see cancel()).
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import shutil
+import asyncio
+import itertools
+import contextlib
+from collections import OrderedDict, deque
+from plugins.config import Config
+from plugins.functions.disk import disk, RECHECK_INTERVAL
+
+# Seconds an upload gets to stop via StopTransmission before its task is cancelled
+CANCEL_GRACE = 5
+
+
+class Job:
+    def __init__(self, job_id, user_id, func, name="", size=None):
+        self.id = job_id
+        self.user_id = user_id
+        self.func = func
+        self.name = name
+        self.size = size
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.holds_network = False
+        # Parts streamed while downloading hold an upload slot too
+        self.streaming = False
+        self.task = None
+        self.cancelled = False
+        self.leftovers = []
+
+    def check(self):
+        """Raise CancelledError at a safe point once the job was cancelled."""
+        if self.cancelled:
+            raise asyncio.CancelledError(f"job {self.id} cancelled")
+
+
+class JobScheduler:
+    def __init__(self, network_limit, upload_limit):
+        self.network_limit = max(1, network_limit)
+        self.upload_limit = max(1, upload_limit)
+        self._queues = OrderedDict()
+        self._network_used = 0
+        self._upload = None
+        self._ids = itertools.count(1)
+        # user_id -> when that user last got a job started (the round-robin clock)
+        self._served = {}
+        self._turns = itertools.count(1)
+        self._running = {}
+        self._recheck = None
+        self.finished = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, user_id, func, name="", size=None):
+        """Queue func(job) for user_id; returns the Job immediately.
+
+        size (bytes on disk) is checked up front: DiskFullError if it can never fit.
+        """
+        disk.check(size)
+        job = Job(f"job{next(self._ids)}", user_id, func, name, size)
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._dispatch()
+        return job
+
+    def position(self, job):
+        """1-based place in the dispatch order, 0 once the job has started."""
+        if job.state != "queued":
+            return 0
+        rounds = [list(self._queues[u]) for u in self._turn_order()]
+        order = []
+        for i in range(max((len(r) for r in rounds), default=0)):
+            order += [r[i] for r in rounds if i < len(r)]
+        return order.index(job) + 1 if job in order else 0
+
+    def user_jobs(self, user_id):
+        queued = list(self._queues.get(user_id, ()))
+        return [j for j in self._running.values() if j.user_id == user_id] + queued
+
+    def get(self, job_id):
+        if job_id in self._running:
+            return self._running[job_id]
+        for queue in self._queues.values():
+            for job in queue:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; its slot and disk reservation free up at once."""
+        job = self.get(job_id)
+        if job is None or job.cancelled:
+            return False
+        job.cancelled = True
+        reservation = disk.release(job.id)
+        if reservation is not None:
+            job.leftovers = list(reservation.paths)
+        if job.state == "queued":
+            queue = self._queues[job.user_id]
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.user_id]
+            job.state = "done"
+            self.cancelled += 1
+            return True
+        self._release_network(job)
+        if job.state == "upload":
+            # progress_for_pyrogram raises StopTransmission on the next
+            # callback; cancel the task if the upload does not stop by itself
+            asyncio.get_running_loop().call_later(CANCEL_GRACE, self._cancel_task, job)
+        else:
+            self._cancel_task(job)
+        return True
+
+    @staticmethod
+    def _cancel_task(job):
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+    @staticmethod
+    def _remove_leftovers(paths):
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def active_users(self):
+        return {j.user_id for j in self._running.values()}
+
+    def _turn_order(self):
+        """Users with queued jobs, in the order _next_job tries them."""
+        running = {}
+        for job in self._running.values():
+            running[job.user_id] = running.get(job.user_id, 0) + 1
+        for user_id in [u for u in self._served if u not in self._queues and u not in running]:
+            del self._served[user_id]
+        return sorted(self._queues, key=lambda u: (running.get(u, 0), self._served.get(u, 0)))
+
+    def _next_job(self):
+        # Fewest running jobs first; ties go round-robin, the user served
+        # last moves to the back of the line. Users whose next job does not
+        # fit on disk yet are passed over.
+        for user_id in self._turn_order():
+            queue = self._queues[user_id]
+            if not disk.try_reserve(queue[0].id, queue[0].size):
+                continue
+            job = queue.popleft()
+            if not queue:
+                del self._queues[user_id]
+            self._served[user_id] = next(self._turns)
+            return job
+        return None
+
+    def _dispatch(self):
+        while self._queues and self._network_used < self.network_limit:
+            job = self._next_job()
+            if job is None:
+                # Nothing fits right now; look again once space may have freed
+                if self._recheck is None:
+                    self._recheck = asyncio.get_running_loop().call_later(RECHECK_INTERVAL, self._recheck_disk)
+                return
+            job.state = "network"
+            job.started = time.time()
+            job.holds_network = True
+            self._network_used += 1
+            self._running[job.id] = job
+            job.task = asyncio.create_task(self._run(job))
+
+    def _recheck_disk(self):
+        self._recheck = None
+        self._dispatch()
+
+    def _release_network(self, job):
+        if job.holds_network:
+            job.holds_network = False
+            self._network_used -= 1
+            self._dispatch()
+
+    async def _run(self, job):
+        try:
+            await job.func(job)
+            job.check()
+            self.finished += 1
+        except asyncio.CancelledError:
+            if job.cancelled:
+                self.cancelled += 1
+            else:
+                self.failed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Job {job.id} ({job.name}) failed")
+        finally:
+            job.state = "done"
+            self._running.pop(job.id, None)
+            disk.release(job.id)
+            self._release_network(job)
+            self._dispatch()
+            if job.cancelled and job.leftovers:
+                await asyncio.to_thread(self._remove_leftovers, job.leftovers)
+
+    def _upload_semaphore(self):
+        if self._upload is None:
+            self._upload = asyncio.Semaphore(self.upload_limit)
+        return self._upload
+
+    @contextlib.asynccontextmanager
+    async def upload_slot(self, job):
+        """Move job from the network stage to the (separately limited) upload stage."""
+        self._release_network(job)
+        job.state = "waiting_upload"
+        async with self._upload_semaphore():
+            job.state = "upload"
+            yield
+
+    @contextlib.asynccontextmanager
+    async def stream_slot(self, job):
+        """Upload slot for parts sent while job is still downloading.
+
+        Counts against MAX_CONCURRENT_UPLOADS like upload_slot, but leaves the
+        network slot and job.state alone.
+        """
+        async with self._upload_semaphore():
+            job.streaming = True
+            try:
+                yield
+            finally:
+                job.streaming = False
+
+    def stats(self):
+        states = [j.state for j in self._running.values()]
+        return dict(
+            queued=sum(len(q) for q in self._queues.values()),
+            downloading=states.count("network"),
+            uploading=states.count("upload"),
+            streaming=sum(j.streaming for j in self._running.values()),
+            waiting_upload=states.count("waiting_upload"),
+            users_waiting=len(self._queues),
+            finished=self.finished,
+            failed=self.failed,
+            cancelled=self.cancelled,
+        )
+
+
+scheduler = JobScheduler(Config.MAX_CONCURRENT_DOWNLOADS, Config.MAX_CONCURRENT_UPLOADS)
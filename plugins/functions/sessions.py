@@ -0,0 +1,138 @@
+# Per-click session store between echo.py and button.py.
+# Keeps only what download/upload need instead of the full yt-dlp info dict,
+# expires on its own, and can persist as zlib-compressed JSON.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import time
+import zlib
+import asyncio
+from plugins.config import Config
+from plugins.functions.ran_text import random_char
+
+FORMAT_FIELDS = (
+    "format_id", "ext", "filesize", "filesize_approx", "width", "height",
+    "vcodec", "acodec", "protocol",
+)
+
+# How often create() also sweeps expired sessions
+SWEEP_INTERVAL = 300
+
+
+def compact_info(info, format_ids):
+    """The fields of an info dict that the download and upload steps read."""
+    wanted = set()
+    for fid in format_ids:
+        wanted.update(fid.split("+"))
+    return dict(
+        title=info.get("title"),
+        duration=info.get("duration"),
+        width=info.get("width"),
+        height=info.get("height"),
+        thumbnail=info.get("thumbnail"),
+        webpage_url=info.get("webpage_url"),
+        extractor=info.get("extractor_key") or info.get("extractor"),
+        formats=[
+            {k: f.get(k) for k in FORMAT_FIELDS}
+            for f in info.get("formats") or []
+            if f.get("format_id") in wanted
+        ],
+    )
+
+
+class SessionStore:
+    def __init__(self, ttl, persist_dir=None):
+        self.ttl = ttl
+        self.persist_dir = persist_dir or None
+        self._sessions = {}
+        self._last_sweep = time.time()
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.sess")
+
+    def _write(self, key, session):
+        with open(self._path(key), "wb") as f:
+            f.write(zlib.compress(json.dumps(session, separators=(",", ":")).encode(), 6))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    async def create(self, user_id, info, format_ids):
+        sess_id = random_char(5)
+        key = f"{user_id}{sess_id}"
+        session = compact_info(info, format_ids)
+        session["expires_at"] = time.time() + self.ttl
+        self._sessions[key] = session
+        if self.persist_dir:
+            await asyncio.to_thread(self._write, key, session)
+        if time.time() - self._last_sweep > SWEEP_INTERVAL:
+            await self.sweep()
+        return sess_id
+
+    async def get(self, user_id, sess_id):
+        key = f"{user_id}{sess_id}"
+        session = self._sessions.get(key)
+        if session is None and self.persist_dir:
+            # Survives restarts when persisted
+            session = await asyncio.to_thread(self._read, key)
+            if session is not None:
+                self._sessions[key] = session
+        if session is None:
+            return None
+        if session["expires_at"] <= time.time():
+            await self.drop(user_id, sess_id)
+            return None
+        return session
+
+    async def drop(self, user_id, sess_id):
+        key = f"{user_id}{sess_id}"
+        self._sessions.pop(key, None)
+        if self.persist_dir:
+            await asyncio.to_thread(self._remove, key)
+
+    def _sweep_disk(self, now):
+        removed = 0
+        for name in os.listdir(self.persist_dir):
+            if not name.endswith(".sess"):
+                continue
+            path = os.path.join(self.persist_dir, name)
+            try:
+                if os.path.getmtime(path) + self.ttl <= now:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    async def sweep(self):
+        """Forget expired sessions; returns how many were removed."""
+        now = time.time()
+        self._last_sweep = now
+        expired = [k for k, s in self._sessions.items() if s["expires_at"] <= now]
+        for key in expired:
+            del self._sessions[key]
+        removed = len(expired)
+        if self.persist_dir:
+            removed = max(removed, await asyncio.to_thread(self._sweep_disk, now))
+        return removed
+
+
+sessions = SessionStore(
+    Config.SESSION_TTL,
+    os.path.join(Config.DOWNLOAD_LOCATION, "sessions") if Config.SESSION_PERSIST else None
+)
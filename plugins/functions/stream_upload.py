@@ -0,0 +1,219 @@
+# Upload Telegram file parts while the download is still writing the file.
+# Only valid when the final size is announced up front and bytes arrive in
+# order (progressive formats, direct links); callers fall back otherwise.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import math
+import asyncio
+import hashlib
+import mimetypes
+from pyrogram import raw, types, utils
+from pyrogram.errors import FloodWait
+
+PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+UPLOAD_WORKERS = 4
+POLL_INTERVAL = 0.25
+
+
+class StreamUploadError(Exception):
+    pass
+
+
+class StreamUpload:
+    def __init__(self, client, path, progress=None, progress_args=(), slot=None):
+        self.client = client
+        # slot() -> async context manager held while parts are sent
+        self.slot = slot
+        # yt-dlp writes to "<name>.part" and renames when done
+        self.paths = [path + ".part", path]
+        self.progress = progress
+        self.progress_args = progress_args
+        self.total_size = 0
+        self.task = None
+        self._done = asyncio.Event()
+        self._fd = None
+
+    def start(self, total_size):
+        """Begin uploading once the final size is known; unknown size = no streaming."""
+        if self.task is None and total_size and total_size > 0:
+            self.total_size = total_size
+            self.task = asyncio.create_task(self._upload())
+
+    def download_finished(self):
+        self._done.set()
+
+    def abort(self):
+        if self.task is not None:
+            self.task.cancel()
+        self._close()
+
+    async def result(self):
+        """InputFile for the streamed upload, or None to use the normal upload."""
+        if self.task is None:
+            return None
+        self._done.set()
+        try:
+            return await self.task
+        except StreamUploadError as e:
+            logger.warning(f"Streaming upload abandoned, falling back: {e}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Streaming upload failed, falling back: {e}")
+        return None
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _available(self):
+        for path in self.paths:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(path, os.O_RDONLY)
+                return os.fstat(self._fd).st_size
+            except FileNotFoundError:
+                continue
+        return 0
+
+    async def _read_part(self, index):
+        start = index * PART_SIZE
+        end = min(start + PART_SIZE, self.total_size)
+        while True:
+            available = self._available()
+            if available > self.total_size:
+                raise StreamUploadError(f"file grew past announced size {self.total_size}")
+            if available >= end:
+                break
+            if self._done.is_set():
+                # One more look: the last write may land right before the event
+                if self._available() >= end:
+                    break
+                raise StreamUploadError(f"download ended at {available} of {self.total_size} bytes")
+            await asyncio.sleep(POLL_INTERVAL)
+        return await asyncio.to_thread(os.pread, self._fd, end - start, start)
+
+    async def _send_part(self, rpc):
+        for attempt in range(5):
+            try:
+                return await self.client.invoke(rpc)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except (OSError, asyncio.TimeoutError):
+                if attempt == 4:
+                    raise
+                await asyncio.sleep(1 + attempt)
+        raise StreamUploadError("upload part kept hitting FloodWait")
+
+    async def _upload(self):
+        if self.slot is None:
+            return await self._send_parts()
+        async with self.slot():
+            return await self._send_parts()
+
+    async def _send_parts(self):
+        file_id = self.client.rnd_id()
+        total_parts = math.ceil(self.total_size / PART_SIZE)
+        is_big = self.total_size > BIG_FILE_SIZE
+        md5 = hashlib.md5()
+        queue = asyncio.Queue(UPLOAD_WORKERS * 2)
+        uploaded = 0
+        failure = None
+
+        async def worker():
+            nonlocal uploaded, failure
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if failure is not None:
+                    # Keep draining so the reader never blocks on a full queue
+                    continue
+                index, chunk = item
+                if is_big:
+                    rpc = raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=index,
+                        file_total_parts=total_parts,
+                        bytes=chunk
+                    )
+                else:
+                    rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=index, bytes=chunk)
+                try:
+                    await self._send_part(rpc)
+                    uploaded += len(chunk)
+                    if self.progress:
+                        await self.progress(uploaded, self.total_size, *self.progress_args)
+                except Exception as e:
+                    failure = e
+
+        workers = [asyncio.create_task(worker()) for _ in range(UPLOAD_WORKERS)]
+        try:
+            for index in range(total_parts):
+                chunk = await self._read_part(index)
+                if failure is not None:
+                    raise failure
+                if not is_big:
+                    md5.update(chunk)
+                await queue.put((index, chunk))
+            await self._done.wait()
+            if self._available() != self.total_size:
+                raise StreamUploadError("final size differs from announced size")
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            if failure is not None:
+                raise failure
+        finally:
+            for w in workers:
+                w.cancel()
+            self._close()
+
+        name = os.path.basename(self.paths[-1])
+        if is_big:
+            return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+        return raw.types.InputFile(id=file_id, parts=total_parts, name=name, md5_checksum=md5.hexdigest())
+
+
+async def send_streamed(client, message, input_file, file_name, caption="", parse_mode=None, thumb=None, video=None):
+    """Reply to message with an already uploaded file; video = (duration, width, height)."""
+    text, entities = (await utils.parse_text_entities(client, caption or "", parse_mode, None)).values()
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if video is not None:
+        duration, width, height = video
+        attributes.insert(0, raw.types.DocumentAttributeVideo(
+            duration=duration or 0,
+            w=width or 0,
+            h=height or 0,
+            supports_streaming=True
+        ))
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=mimetypes.guess_type(file_name)[0] or "video/mp4",
+        file=input_file,
+        thumb=await client.save_file(thumb) if thumb else None,
+        attributes=attributes,
+        force_file=video is None or None
+    )
+    r = await client.invoke(
+        raw.functions.messages.SendMedia(
+            peer=await client.resolve_peer(message.chat.id),
+            media=media,
+            reply_to=raw.types.InputReplyToMessage(reply_to_msg_id=message.id),
+            random_id=client.rnd_id(),
+            message=text,
+            entities=entities
+        )
+    )
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                client, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats}
+            )
+    return None
@@ -0,0 +1,106 @@
+# Prepared custom thumbnails, one JPEG per Telegram file_id under
+# DOWNLOAD_LOCATION/thumbs. The first upload with a thumbnail downloads and
+# shrinks it to fit 320x320 in a worker thread; later uploads reuse the file.
+# The least recently used files go once there are more than THUMB_CACHE_SIZE.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import asyncio
+import hashlib
+from PIL import Image, ImageOps
+from plugins.config import Config
+
+# Telegram ignores thumbnails larger than 320px on either side
+THUMB_SIZE = 320
+JPEG_QUALITY = 87
+
+
+def prepare_thumbnail(src, dst):
+    """Write src as an RGB JPEG that fits THUMB_SIZE x THUMB_SIZE."""
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        img.save(dst, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+
+class ThumbCache:
+    def __init__(self, root, max_entries):
+        self.root = root
+        self.max_entries = max_entries
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, file_id):
+        return os.path.join(self.root, hashlib.sha256(file_id.encode()).hexdigest()[:32] + ".jpg")
+
+    def owns(self, path):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root)
+
+    def _evict(self):
+        names = [n for n in os.listdir(self.root) if n.endswith(".jpg")]
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.root, n) for n in names]
+        paths.sort(key=lambda p: os.stat(p).st_mtime)
+        for p in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def _store(self, src, dst):
+        tmp = dst + ".tmp"
+        try:
+            prepare_thumbnail(src, tmp)
+            os.replace(tmp, dst)
+        finally:
+            for p in (src, tmp):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+        self._evict()
+
+    async def _fetch(self, bot, file_id, path):
+        try:
+            src = await bot.download_media(message=file_id, file_name=path + ".src")
+            if src is None:
+                return None
+            await asyncio.to_thread(self._store, src, path)
+            return path
+        except Exception as e:
+            logger.warning(f"Thumbnail {file_id} unavailable: {e}")
+            return None
+
+    async def get(self, bot, file_id):
+        """Local path of the prepared thumbnail for file_id; None if it can't be made."""
+        path = self.path(file_id)
+        try:
+            # mtime doubles as the LRU clock
+            os.utime(path)
+            self.hits += 1
+            return path
+        except OSError:
+            pass
+        task = self._pending.get(path)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(bot, file_id, path))
+            self._pending[path] = task
+            task.add_done_callback(lambda _: self._pending.pop(path, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / total if total else 0.0,
+        )
+
+
+thumbs = ThumbCache(os.path.join(Config.DOWNLOAD_LOCATION, "thumbs"), Config.THUMB_CACHE_SIZE)
@@ -2,28 +2,60 @@ import asyncio
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 from pyrogram.errors import FloodWait, UserIsBlocked, MessageNotModified, PeerIdInvalid
 from typing import Union
-import pytz
 import random 
 import re
 import os
-from datetime import datetime, date
+from datetime import datetime
 import string
 from typing import List
 from plugins.database.database import db
+from plugins.database.verification import verification
+from plugins.functions.http_client import http
 import requests
-import aiohttp
 import json
+import time
+import logging
 from plugins.config import Config
 
+logger = logging.getLogger(__name__)
 
-TOKENS = {}
-VERIFIED = {}
+# link -> (shortened url, expiry); failures are not cached
+SHORT_LINKS = {}
+SHORT_LINKS_MAX = 10000
+# user id -> (token, expiry): repeat prompts reuse the link (and its cached short URL)
+PENDING_TOKENS = {}
 
 LOG_TEXT_P = """#NewUser
 ID - <code>{}</code>
 Name - {}"""
 
 
+async def shorten_link(link):
+    """The shortener's URL for link, or None when the API call fails."""
+    API = Config.SHORT_API
+    URL = Config.SHORT_DOMAIN
+    try:
+        if URL == "api.shareus.in":
+            params = {"token": API,
+                      "format": "json",
+                      "link": link,
+                      }
+            data = await http.get_json(f"https://{URL}/shortLink", params=params, content_type="text/html", ssl=False)
+            key = "shortlink"
+        else:
+            params = {'api': API,
+                      'url': link,
+                      }
+            data = await http.get_json(f'https://{URL}/api', params=params, ssl=False)
+            key = "shortenedUrl"
+        if data["status"] == "success":
+            return data[key]
+        logger.error(f"Error: {data['message']}")
+    except Exception as e:
+        logger.error(e)
+    return None
+
+
 async def get_verify_shorted_link(link):
     API = Config.SHORT_API
     URL = Config.SHORT_DOMAIN
@@ -32,95 +64,53 @@ async def get_verify_shorted_link(link):
         https = "https"
         link = link.replace("http", https)
 
+    cached = SHORT_LINKS.get(link)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    short = await shorten_link(link)
+    if short is not None:
+        if len(SHORT_LINKS) >= SHORT_LINKS_MAX:
+            SHORT_LINKS.pop(next(iter(SHORT_LINKS)))
+        SHORT_LINKS[link] = (short, time.monotonic() + Config.SHORTLINK_CACHE_TTL)
+        return short
     if URL == "api.shareus.in":
-        url = f"https://{URL}/shortLink"
-        params = {"token": API,
-                  "format": "json",
-                  "link": link,
-                  }
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, raise_for_status=True, ssl=False) as response:
-                    data = await response.json(content_type="text/html")
-                    if data["status"] == "success":
-                        return data["shortlink"]
-                    else:
-                        logger.error(f"Error: {data['message']}")
-                        return f'https://{URL}/shortLink?token={API}&format=json&link={link}'
+        return f'https://{URL}/shortLink?token={API}&format=json&link={link}'
+    return f'https://{URL}/api?api={API}&link={link}'
 
-        except Exception as e:
-            logger.error(e)
-            return f'https://{URL}/shortLink?token={API}&format=json&link={link}'
-    else:
-        url = f'https://{URL}/api'
-        params = {'api': API,
-                  'url': link,
-                  }
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, raise_for_status=True, ssl=False) as response:
-                    data = await response.json()
-                    if data["status"] == "success":
-                        return data['shortenedUrl']
-                    else:
-                        logger.error(f"Error: {data['message']}")
-                        return f'https://{URL}/api?api={API}&link={link}'
-
-        except Exception as e:
-            logger.error(e)
-            return f'{URL}/api?api={API}&link={link}'
+async def register_user(bot, userid):
+    """Store a first-time user and announce them in LOG_CHANNEL."""
+    if not db.is_known(userid) and await db.add_user(userid):
+        await bot.send_message(Config.LOG_CHANNEL, LOG_TEXT_P.format(userid, f'<a href="tg://user?id={userid}">{userid}</a>'))
 
 async def check_token(bot, userid, token):
-    user = await bot.get_users(userid)
-    if not await db.is_user_exist(user.id):
-        await db.add_user(user.id, user.first_name)
-        await bot.send_message(Config.LOG_CHANNEL, LOG_TEXT_P.format(user.id, user.mention))
-    if user.id in TOKENS.keys():
-        TKN = TOKENS[user.id]
-        if token in TKN.keys():
-            is_used = TKN[token]
-            if is_used == True:
-                return False
-            else:
-                return True
-    else:
-        return False
+    userid = int(userid)
+    await register_user(bot, userid)
+    return await verification.token_valid(userid, token)
 
 async def get_token(bot, userid, link):
-    user = await bot.get_users(userid)
-    if not await db.is_user_exist(user.id):
-        await db.add_user(user.id, user.first_name)
-        await bot.send_message(Config.LOG_CHANNEL, LOG_TEXT_P.format(user.id, user.mention))
-    token = ''.join(random.choices(string.ascii_letters + string.digits, k=7))
-    TOKENS[user.id] = {token: False}
-    link = f"{link}verify-{user.id}-{token}"
+    userid = int(userid)
+    await register_user(bot, userid)
+    pending = PENDING_TOKENS.get(userid)
+    if pending is not None and pending[1] > time.monotonic():
+        token = pending[0]
+    else:
+        token = ''.join(random.choices(string.ascii_letters + string.digits, k=7))
+        await verification.new_token(userid, token)
+        if len(PENDING_TOKENS) >= SHORT_LINKS_MAX:
+            PENDING_TOKENS.pop(next(iter(PENDING_TOKENS)))
+        PENDING_TOKENS[userid] = (token, time.monotonic() + min(Config.SHORTLINK_CACHE_TTL, Config.VERIFY_TOKEN_TTL))
+    link = f"{link}verify-{userid}-{token}"
     shortened_verify_url = await get_verify_shorted_link(link)
     return str(shortened_verify_url)
 
 async def verify_user(bot, userid, token):
-    user = await bot.get_users(userid)
-    if not await db.is_user_exist(user.id):
-        await db.add_user(user.id, user.first_name)
-        await bot.send_message(Config.LOG_CHANNEL, LOG_TEXT_P.format(user.id, user.mention))
-    TOKENS[user.id] = {token: True}
-    tz = pytz.timezone('Asia/Kolkata')
-    today = date.today()
-    VERIFIED[user.id] = str(today)
+    userid = int(userid)
+    await register_user(bot, userid)
+    PENDING_TOKENS.pop(userid, None)
+    await verification.mark_verified(userid, token)
 
 async def check_verification(bot, userid):
-    user = await bot.get_users(userid)
-    if not await db.is_user_exist(user.id):
-        await db.add_user(user.id, user.first_name)
-        await bot.send_message(Config.LOG_CHANNEL, LOG_TEXT_P.format(user.id, user.mention))
-    tz = pytz.timezone('Asia/Tokyo')
-    today = date.today()
-    if user.id in VERIFIED.keys():
-        EXP = VERIFIED[user.id]
-        years, month, day = EXP.split('-')
-        comp = date(int(years), int(month), int(day))
-        if comp<today:
-            return False
-        else:
-            return True
-    else:
-        return False
+    # Verified today = in-memory hit, no network call
+    userid = int(userid)
+    await register_user(bot, userid)
+    return await verification.is_verified(userid)
@@ -0,0 +1,302 @@
+# Long-lived yt-dlp worker processes.
+# Each worker imports yt_dlp once and keeps YoutubeDL instances warm, so a
+# job costs the extraction itself instead of interpreter + extractor startup.
+# Extraction and downloads run in separate pools: a link sent while every
+# download worker is busy still gets its formats right away.
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import signal
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from plugins.config import Config
+from plugins.functions.progress import ProgressEvent, publish, subscribe
+
+# Keys of yt-dlp progress hook dicts worth sending across the pipe
+PROGRESS_KEYS = (
+    "status", "downloaded_bytes", "total_bytes", "total_bytes_estimate",
+    "speed", "eta", "elapsed", "fragment_index", "fragment_count",
+    "filename", "tmpfilename",
+)
+
+# Workers dying sooner than this after start are respawned with a delay
+RESPAWN_DELAY = 5
+
+
+class _YdlLogger:
+    """Route yt-dlp output to logging instead of the worker's stdout."""
+
+    def __init__(self):
+        self.log = logging.getLogger("yt_dlp")
+
+    def debug(self, msg):
+        if not msg.startswith("[debug] "):
+            self.log.info(msg)
+
+    def info(self, msg):
+        self.log.info(msg)
+
+    def warning(self, msg):
+        self.log.warning(msg)
+
+    def error(self, msg):
+        self.log.error(msg)
+
+
+def _worker_main(jobs, events, max_jobs):
+    # Own process group: cancelling a job kills aria2c/ffmpeg children too
+    os.setsid()
+    try:
+        import yt_dlp
+    except ImportError as e:
+        yt_dlp, import_error = None, str(e)
+
+    # yt-dlp calls hooks from fragment threads; keep pipe messages whole
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            events.send(msg)
+
+    warm = {}
+    served = 0
+    while max_jobs <= 0 or served < max_jobs:
+        try:
+            job = jobs.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        job_id, kind, args, url = job
+        try:
+            if yt_dlp is None:
+                raise RuntimeError(f"yt-dlp is not installed: {import_error}")
+            if kind == "extract":
+                key = tuple(args)
+                ydl = warm.get(key)
+                if ydl is None:
+                    params = yt_dlp.parse_options(list(args)).ydl_opts
+                    params.update(quiet=True, noprogress=True, logger=_YdlLogger())
+                    ydl = warm[key] = yt_dlp.YoutubeDL(params)
+                info = ydl.extract_info(url, download=False)
+                if info.get("_type") == "playlist" and info.get("entries"):
+                    info = next(e for e in info["entries"] if e)
+                result = ydl.sanitize_info(info)
+            else:
+                def hook(d):
+                    send(("progress", job_id, {k: d.get(k) for k in PROGRESS_KEYS}))
+
+                params = yt_dlp.parse_options(list(args)).ydl_opts
+                params.update(quiet=True, noprogress=True, logger=_YdlLogger(), progress_hooks=[hook])
+                with yt_dlp.YoutubeDL(params) as ydl:
+                    info = ydl.extract_info(url, download=True)
+                    downloads = info.get("requested_downloads") or [{}]
+                    result = dict(
+                        filepath=downloads[-1].get("filepath") or ydl.prepare_filename(info),
+                        title=info.get("title"),
+                    )
+            send(("done", job_id, result))
+        except BaseException as e:
+            send(("error", job_id, str(e) or e.__class__.__name__))
+        served += 1
+
+
+class _Worker:
+    def __init__(self, ctx, max_jobs):
+        child_jobs, self.jobs = ctx.Pipe(duplex=False)
+        self.events, child_events = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_jobs, child_events, max_jobs),
+            daemon=True
+        )
+        self.process.start()
+        child_jobs.close()
+        child_events.close()
+        self.started = time.monotonic()
+        self.job_id = None
+        self.served = 0
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        # The reader thread reaps the process once its pipe hits EOF
+        self.jobs.close()
+
+
+class YtdlPool:
+    def __init__(self, name, size, max_jobs_per_worker):
+        self.name = name
+        self.size = max(1, size)
+        self.max_jobs = max_jobs_per_worker
+        self._ctx = multiprocessing.get_context("spawn")
+        self._ids = itertools.count(1)
+        self._workers = []
+        self._pending = deque()
+        self._futures = {}
+        self._loop = None
+        self.completed = 0
+        self.failed = 0
+        self.recycled = 0
+
+    def _start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            for _ in range(self.size):
+                self._spawn()
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.max_jobs)
+        self._workers.append(worker)
+        threading.Thread(target=self._read, args=(worker,), daemon=True).start()
+        return worker
+
+    def _read(self, worker):
+        # One blocking reader per worker; a dead worker only breaks its own pipe
+        while True:
+            try:
+                msg = worker.events.recv()
+            except (EOFError, OSError):
+                break
+            self._post(self._on_event, worker, msg)
+        worker.events.close()
+        # EOF means the worker is exiting; reap it here, off the event loop
+        worker.process.join()
+        self._post(self._on_exit, worker)
+
+    def _post(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    def _on_event(self, worker, msg):
+        kind, job_id, payload = msg
+        if kind == "progress":
+            if job_id in self._futures:
+                publish(ProgressEvent.from_hook(job_id, payload))
+            return
+        worker.job_id = None
+        worker.served += 1
+        future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            if kind == "done":
+                self.completed += 1
+                future.set_result(payload)
+            else:
+                self.failed += 1
+                future.set_exception(RuntimeError(payload))
+        self._dispatch()
+
+    def _on_exit(self, worker):
+        if worker not in self._workers:
+            return
+        self._workers.remove(worker)
+        worker.jobs.close()
+        recycled = worker.job_id is None and 0 < self.max_jobs <= worker.served
+        if worker.job_id is not None:
+            future = self._futures.pop(worker.job_id, None)
+            if future is not None and not future.done():
+                self.failed += 1
+                future.set_exception(RuntimeError("yt-dlp worker died"))
+        if recycled:
+            self.recycled += 1
+            self._respawn()
+        elif time.monotonic() - worker.started < RESPAWN_DELAY:
+            # Crashing on startup; don't spin in a spawn loop
+            logger.error("yt-dlp worker exited right after start, respawning later")
+            self._loop.call_later(RESPAWN_DELAY, self._respawn)
+        else:
+            self._respawn()
+
+    def _respawn(self):
+        if len(self._workers) < self.size:
+            self._spawn()
+        self._dispatch()
+
+    def _idle_worker(self):
+        for worker in self._workers:
+            if worker.job_id is None and worker.process.is_alive() and \
+                    (self.max_jobs <= 0 or worker.served < self.max_jobs):
+                return worker
+        return None
+
+    def _dispatch(self):
+        while self._pending:
+            worker = self._idle_worker()
+            if worker is None:
+                return
+            job = self._pending.popleft()
+            worker.job_id = job[0]
+            try:
+                worker.jobs.send(job)
+            except OSError:
+                worker.job_id = None
+                self._pending.appendleft(job)
+                return
+
+    async def _run(self, kind, args, url, progress=None, job_id=None):
+        self._start()
+        job_id = job_id or f"{self.name}{next(self._ids)}"
+        future = self._loop.create_future()
+        self._futures[job_id] = future
+        unsubscribe = subscribe(progress, job_id) if progress is not None else None
+        self._pending.append((job_id, kind, list(args), url))
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.cancel(job_id)
+            raise
+        finally:
+            if unsubscribe is not None:
+                unsubscribe()
+
+    async def extract(self, args, url, job_id=None):
+        """Info dict for url, like `yt-dlp -j <args> url` (first entry of playlists)."""
+        return await self._run("extract", args, url, job_id=job_id)
+
+    async def download(self, args, url, progress=None, job_id=None):
+        """Download url with CLI-style args; progress gets this job's ProgressEvents."""
+        return await self._run("download", args, url, progress=progress, job_id=job_id)
+
+    def cancel(self, job_id):
+        """Drop a queued job or kill the worker (and its children) running it."""
+        future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            future.cancel()
+        for job in self._pending:
+            if job[0] == job_id:
+                self._pending.remove(job)
+                return True
+        for worker in self._workers:
+            if worker.job_id == job_id:
+                worker.job_id = None
+                self._workers.remove(worker)
+                worker.kill()
+                self._respawn()
+                return True
+        return False
+
+    def stats(self):
+        return dict(
+            workers=len(self._workers),
+            busy=sum(1 for w in self._workers if w.job_id is not None),
+            queued=len(self._pending),
+            completed=self.completed,
+            failed=self.failed,
+            recycled=self.recycled,
+        )
+
+
+extract_pool = YtdlPool("extract", Config.YTDL_POOL_SIZE, Config.YTDL_WORKER_MAX_JOBS)
+download_pool = YtdlPool("download", Config.YTDL_DOWNLOAD_WORKERS, Config.YTDL_WORKER_MAX_JOBS)
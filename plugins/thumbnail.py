@@ -11,18 +11,17 @@ logger = logging.getLogger(__name__)
 import random
 import numpy
 import os
-from PIL import Image
 import time
 
 # the Strings used for this "thing"
 from plugins.script import Translation
 from pyrogram import Client
 from plugins.database.add import AddUser
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 from pyrogram import filters
 from plugins.functions.help_Nekmo_ffmpeg import take_screen_shot
+from plugins.functions.thumbs import thumbs
+from plugins.functions.metadata import metadata
 import psutil
 import shutil
 import string
@@ -109,64 +108,35 @@ async def viewthumbnail(bot, update):
 
 
 async def Gthumb01(bot, update):
-    thumb_image_path = f"{Config.DOWNLOAD_LOCATION}/{str(update.from_user.id)}.jpg"
     db_thumbnail = await db.get_thumbnail(update.from_user.id)
     if db_thumbnail is not None:
-        thumbnail = await bot.download_media(message=db_thumbnail, file_name=thumb_image_path)
-        Image.open(thumbnail).convert("RGB").save(thumbnail)
-        img = Image.open(thumbnail)
-        img.resize((100, 100))
-        img.save(thumbnail, "JPEG")
+        thumbnail = await thumbs.get(bot, db_thumbnail)
     else:
         thumbnail = None
 
     return thumbnail
 
 async def Gthumb02(bot, update, duration, download_directory):
-    thumb_image_path = f"{Config.DOWNLOAD_LOCATION}/{str(update.from_user.id)}.jpg"
     db_thumbnail = await db.get_thumbnail(update.from_user.id)
     
     if db_thumbnail is not None:
-        return await bot.download_media(message=db_thumbnail, file_name=thumb_image_path)
+        return await thumbs.get(bot, db_thumbnail)
     elif duration > 1:
         return await take_screen_shot(download_directory, os.path.dirname(download_directory), random.randint(0, duration - 1))
     else:
 
         return None
-async def Mdata01(download_directory):
-
-          width = 0
-          height = 0
-          duration = 0
-          metadata = extractMetadata(createParser(download_directory))
-          if metadata is not None:
-              if metadata.has("duration"):
-                  duration = metadata.get('duration').seconds
-              if metadata.has("width"):
-                  width = metadata.get("width")
-              if metadata.has("height"):
-                  height = metadata.get("height")
-
-          return width, height, duration
-
-async def Mdata02(download_directory):
-
-          width = 0
-          duration = 0
-          metadata = extractMetadata(createParser(download_directory))
-          if metadata is not None:
-              if metadata.has("duration"):
-                  duration = metadata.get('duration').seconds
-              if metadata.has("width"):
-                  width = metadata.get("width")
-
-          return width, duration
-
-async def Mdata03(download_directory):
-
-    metadata = extractMetadata(createParser(download_directory))
-    return (
-        metadata.get('duration').seconds
-        if metadata is not None and metadata.has("duration")
-        else 0
-    )
+async def Mdata01(download_directory, known=None):
+
+          meta = await metadata.probe(download_directory, known)
+          return meta["width"], meta["height"], meta["duration"]
+
+async def Mdata02(download_directory, known=None):
+
+          meta = await metadata.probe(download_directory, known, need=("width", "duration"))
+          return meta["width"], meta["duration"]
+
+async def Mdata03(download_directory, known=None):
+
+    meta = await metadata.probe(download_directory, known, need=("duration",))
+    return meta["duration"]
@@ -0,0 +1,5 @@
+import os
+
+# plugins.config reads these as ints at import time
+for name in ("API_ID", "LOG_CHANNEL", "OWNER_ID"):
+    os.environ.setdefault(name, "1")
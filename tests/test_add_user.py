@@ -0,0 +1,52 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from plugins.config import Config
+from plugins.database import add
+from plugins.database.database import Database
+
+
+class FakeUsers:
+    def __init__(self):
+        self.ids = set()
+        self.calls = 0
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls += 1
+        new = query['id'] not in self.ids
+        self.ids.add(query['id'])
+        return SimpleNamespace(upserted_id=object() if new else None)
+
+
+class AddUserTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = Database("mongodb://localhost", "test")
+        self.db.col = FakeUsers()
+
+    def update(self, user_id):
+        return SimpleNamespace(from_user=SimpleNamespace(id=user_id))
+
+    async def test_known_users_skip_the_database(self):
+        with mock.patch.object(add, "db", self.db):
+            for _ in range(3):
+                await add.AddUser(None, self.update(1))
+        self.assertEqual(self.db.col.calls, 1)
+        # New users are cached with their default profile
+        self.assertTrue(self.db.cache.get(1)['apply_caption'])
+
+    async def test_add_user_is_idempotent(self):
+        self.assertTrue(await self.db.add_user(1))
+        self.assertFalse(await self.db.add_user("1"))
+        self.assertEqual(self.db.col.ids, {1})
+
+    def test_known_set_is_bounded(self):
+        with mock.patch.object(Config, "KNOWN_USERS_MAX", 2):
+            for user_id in (1, 2, 3):
+                self.db._remember(user_id)
+        self.assertFalse(self.db.is_known(1))
+        self.assertTrue(self.db.is_known(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
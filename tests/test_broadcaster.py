@@ -0,0 +1,115 @@
+import asyncio
+import time
+import unittest
+
+from plugins.config import Config
+from plugins.functions import broadcaster
+from plugins.functions.broadcaster import MIN_RATE, RECOVER_AFTER, Broadcast, TokenBucket
+
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+    async def test_take_paces_to_the_rate(self):
+        bucket = TokenBucket(50)
+        start = time.monotonic()
+        for _ in range(11):
+            await bucket.take()
+        # One token is there up front, the other ten take 1/50 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_flood_wait_backs_off_and_success_recovers(self):
+        bucket = TokenBucket(10)
+        bucket.flood_wait(0)
+        self.assertAlmostEqual(bucket.rate, 7)
+        for _ in range(RECOVER_AFTER):
+            bucket.success()
+        self.assertAlmostEqual(bucket.rate, 8)
+
+    def test_rate_never_drops_below_minimum(self):
+        bucket = TokenBucket(2)
+        for _ in range(10):
+            bucket.flood_wait(0)
+        self.assertEqual(bucket.rate, MIN_RATE)
+
+
+class FakeMessage:
+    def __init__(self, delays):
+        self.delays = delays
+        self.sent = []
+
+    async def copy(self, chat_id):
+        await asyncio.sleep(self.delays.get(chat_id, 0))
+        self.sent.append(chat_id)
+
+
+async def cursor(docs):
+    for doc in docs:
+        yield doc
+
+
+class BroadcastTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._rate, Config.BROADCAST_RATE = Config.BROADCAST_RATE, 1000
+        self._senders, Config.BROADCAST_SENDERS = Config.BROADCAST_SENDERS, 4
+
+    def tearDown(self):
+        Config.BROADCAST_RATE = self._rate
+        Config.BROADCAST_SENDERS = self._senders
+
+    def test_checkpoint_covers_only_the_finished_prefix(self):
+        broadcast = Broadcast("b", None, 4)
+        for doc_id in (1, 2, 3, 4):
+            broadcast._in_flight[doc_id] = None
+        broadcast._advance(2, 200)
+        broadcast._advance(3, 500)
+        self.assertEqual(broadcast.committed(), dict(last_id=None, done=0, success=0, failed=0))
+        broadcast._advance(1, 200)
+        self.assertEqual(broadcast.committed(), dict(last_id=3, done=3, success=2, failed=1))
+
+    def test_dead_users_count_at_once(self):
+        broadcast = Broadcast("b", None, 2)
+        broadcast._in_flight[1] = None
+        broadcast._in_flight[2] = None
+        broadcast._advance(2, 400)
+        self.assertEqual(broadcast.committed(), dict(last_id=None, done=1, success=0, failed=1))
+        broadcast._advance(1, 200)
+        self.assertEqual(broadcast.committed(), dict(last_id=2, done=2, success=1, failed=1))
+
+    async def test_run_sends_to_everyone(self):
+        message = FakeMessage({1: 0.05})
+        saved = []
+
+        async def checkpoint(broadcast):
+            saved.append(broadcast.committed())
+
+        broadcast = Broadcast("b", message, 6, checkpoint=checkpoint)
+        await broadcast.run(cursor([{'_id': i, 'id': i} for i in range(1, 7)]))
+        self.assertEqual(sorted(message.sent), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(saved[-1], dict(last_id=6, done=6, success=6, failed=0))
+
+    async def test_resume_does_not_count_in_flight_users_twice(self):
+        saved = []
+
+        async def checkpoint(broadcast):
+            saved.append(broadcast.committed())
+
+        self._every, broadcaster.CHECKPOINT_EVERY = broadcaster.CHECKPOINT_EVERY, 2
+        self.addCleanup(setattr, broadcaster, "CHECKPOINT_EVERY", self._every)
+        # User 1 is slow: 2 and 3 finish first and trigger a checkpoint
+        message = FakeMessage({1: 0.2})
+        broadcast = Broadcast("b", message, 3, checkpoint=checkpoint)
+        task = asyncio.create_task(broadcast.run(cursor([{'_id': i, 'id': i} for i in (1, 2, 3)])))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        resume = saved[-1]
+        self.assertEqual(resume, dict(last_id=None, done=0, success=0, failed=0))
+
+        message = FakeMessage({})
+        resumed = Broadcast("b", message, 3, resume=resume)
+        await resumed.run(cursor([{'_id': i, 'id': i} for i in (1, 2, 3)]))
+        self.assertEqual((resumed.done, resumed.success), (3, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.functions.disk import MERGE_FACTOR, DiskAdmission, DiskFullError, announced_size
+
+INFO = {
+    "formats": [
+        {"format_id": "137", "filesize": 1000, "acodec": "none"},
+        {"format_id": "140", "filesize_approx": 100, "acodec": "mp4a"},
+        {"format_id": "18", "filesize": 500, "acodec": "mp4a"},
+        {"format_id": "248", "acodec": "none"},
+    ]
+}
+
+
+class AnnouncedSizeTest(unittest.TestCase):
+    def test_progressive_format(self):
+        self.assertEqual(announced_size(INFO, "18"), 500)
+
+    def test_merged_format_sums_parts(self):
+        self.assertEqual(announced_size(INFO, "137+140"), int(1100 * MERGE_FACTOR))
+
+    def test_video_only_format(self):
+        self.assertEqual(announced_size(INFO, "137"), int(1000 * MERGE_FACTOR))
+
+    def test_unknown_part(self):
+        self.assertIsNone(announced_size(INFO, "248+140"))
+        self.assertIsNone(announced_size(INFO, "137+999"))
+        self.assertIsNone(announced_size({}, "18"))
+
+
+class DiskAdmissionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        free = shutil.disk_usage(self.root).free
+        # Leave 10 MB that jobs may claim
+        self.disk = DiskAdmission(self.root, free - 10 * 2 ** 20)
+
+    def test_reservations_share_the_space(self):
+        self.assertTrue(self.disk.try_reserve("a", 6 * 2 ** 20))
+        self.assertFalse(self.disk.try_reserve("b", 6 * 2 ** 20))
+        self.disk.release("a")
+        self.assertTrue(self.disk.try_reserve("b", 6 * 2 ** 20))
+
+    def test_check_rejects_what_never_fits(self):
+        with self.assertRaises(DiskFullError):
+            self.disk.check(100 * 2 ** 20)
+        self.assertEqual(self.disk.stats()["rejected"], 1)
+
+    async def test_written_bytes_are_no_longer_outstanding(self):
+        self.disk.try_reserve("a", 2 ** 20)
+        path = os.path.join(self.root, "a.part")
+        self.disk.track("a", path)
+        with open(path, "wb") as f:
+            f.write(b"\0" * 4096)
+        await self.disk.refresh()
+        self.assertEqual(self.disk.stats()["outstanding"], 2 ** 20 - 4096)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from plugins.functions.edits import TICK, EditCoalescer
+
+
+class FakeMessage:
+    def __init__(self, delay=0):
+        self.chat = SimpleNamespace(id=1)
+        self.id = 2
+        self.media = None
+        self.delay = delay
+        self.texts = []
+
+    async def edit_text(self, text, parse_mode=None, reply_markup=None):
+        await asyncio.sleep(self.delay)
+        self.texts.append(text)
+
+
+class EditCoalescerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_only_the_newest_text_is_sent(self):
+        edits = EditCoalescer(interval=0, rate=10)
+        message = FakeMessage()
+        for i in range(5):
+            edits.submit(message, f"{i}%")
+        await asyncio.sleep(TICK * 2)
+        self.assertEqual(message.texts, ["4%"])
+        self.assertEqual(edits.stats()["sent"], 1)
+
+    async def test_unchanged_text_is_skipped(self):
+        edits = EditCoalescer(interval=0, rate=10)
+        message = FakeMessage()
+        edits.submit(message, "50%")
+        await asyncio.sleep(TICK * 2)
+        edits.submit(message, "50%")
+        await asyncio.sleep(TICK * 2)
+        self.assertEqual(message.texts, ["50%"])
+
+    async def test_interval_limits_edits_per_message(self):
+        edits = EditCoalescer(interval=60, rate=10)
+        message = FakeMessage()
+        edits.submit(message, "1%")
+        await asyncio.sleep(TICK * 2)
+        edits.submit(message, "2%")
+        await asyncio.sleep(TICK * 2)
+        self.assertEqual(message.texts, ["1%"])
+        self.assertEqual(edits.stats()["pending"], 1)
+        await edits.forget(message)
+
+    async def test_forget_drops_queued_edits(self):
+        edits = EditCoalescer(interval=0, rate=10)
+        message = FakeMessage()
+        edits.submit(message, "1%")
+        await edits.forget(message)
+        await asyncio.sleep(TICK * 2)
+        self.assertEqual(message.texts, [])
+
+    async def test_forget_waits_for_an_edit_in_flight(self):
+        edits = EditCoalescer(interval=0, rate=10)
+        message = FakeMessage(delay=TICK * 2)
+        edits.submit(message, "99%")
+        await asyncio.sleep(TICK * 1.5)
+        await edits.forget(message)
+        # The final status edit comes after the stale progress edit, not before
+        message.texts.append("done")
+        await asyncio.sleep(TICK * 3)
+        self.assertEqual(message.texts, ["99%", "done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
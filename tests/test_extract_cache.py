@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from plugins.functions.extract_cache import EXPIRY_SAFETY_MARGIN, ExtractCache, info_expiry, normalize_url
+
+
+class NormalizeUrlTest(unittest.TestCase):
+    def test_youtube_forms_agree(self):
+        canonical = normalize_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        for url in (
+            "https://youtu.be/dQw4w9WgXcQ",
+            "https://youtu.be/dQw4w9WgXcQ?t=42",
+            "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+            "https://youtube.com/shorts/dQw4w9WgXcQ?si=abc",
+            "  https://WWW.YouTube.com:443/watch?v=dQw4w9WgXcQ  ",
+        ):
+            self.assertEqual(normalize_url(url), canonical, url)
+
+    def test_tracking_params_and_order_are_ignored(self):
+        self.assertEqual(
+            normalize_url("https://a.com/v?b=2&utm_source=x&a=1#frag"),
+            normalize_url("https://a.com/v?a=1&b=2"),
+        )
+
+    def test_meaningful_differences_are_kept(self):
+        self.assertNotEqual(normalize_url("https://a.com/v?id=1"), normalize_url("https://a.com/v?id=2"))
+        self.assertNotEqual(normalize_url("https://a.com:8080/v"), normalize_url("https://a.com/v"))
+
+
+class InfoExpiryTest(unittest.TestCase):
+    def test_earliest_signed_url_wins(self):
+        info = {"formats": [
+            {"url": "https://cdn/a?expire=2000000000"},
+            {"url": "https://cdn/b?hdnts=st=1~exp=1900000000~hmac=x"},
+            {"url": "https://cdn/c"},
+        ]}
+        self.assertEqual(info_expiry(info), 1900000000)
+
+    def test_unsigned(self):
+        self.assertIsNone(info_expiry({"url": "https://cdn/a?x=1"}))
+
+
+class ExtractCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_hit_after_put(self):
+        cache = ExtractCache(10, 3600)
+        await cache.put("https://youtu.be/dQw4w9WgXcQ", {"title": "a"})
+        self.assertEqual(await cache.get("https://www.youtube.com/watch?v=dQw4w9WgXcQ"), {"title": "a"})
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    async def test_lru_bound(self):
+        cache = ExtractCache(2, 3600)
+        for i in range(3):
+            await cache.put(f"https://a.com/{i}", {"i": i})
+        self.assertIsNone(await cache.get("https://a.com/0"))
+        self.assertEqual(await cache.get("https://a.com/2"), {"i": 2})
+
+    async def test_urls_about_to_expire_are_not_cached(self):
+        cache = ExtractCache(10, 3600)
+        soon = int(time.time()) + EXPIRY_SAFETY_MARGIN // 2
+        await cache.put("https://a.com/v", {"url": f"https://cdn/v?expire={soon}"})
+        self.assertIsNone(await cache.get("https://a.com/v"))
+
+    async def test_disk_tier_survives_a_new_instance(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        await ExtractCache(10, 3600, root).put("https://a.com/v", {"title": "a"})
+        cache = ExtractCache(10, 3600, root)
+        self.assertEqual(await cache.get("https://a.com/v"), {"title": "a"})
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        cache.invalidate("https://a.com/v")
+        self.assertEqual(os.listdir(root), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from types import SimpleNamespace
+
+from plugins.database.file_cache import FileCache
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """The slice of a motor collection FileCache uses, keyed on 'key'."""
+
+    def __init__(self):
+        self.docs = {}
+        self._ids = 0
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def find_one_and_update(self, query, update):
+        doc = self.docs.get(query['key'])
+        if doc is not None:
+            before = dict(doc)
+            doc.update(update['$set'])
+            doc['hits'] += update['$inc']['hits']
+            return before
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query['key'])
+        if doc is None:
+            self._ids += 1
+            doc = self.docs[query['key']] = dict(_id=self._ids, key=query['key'], **update['$setOnInsert'])
+        doc.update(update['$set'])
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query, projection):
+        return FakeCursor(list(self.docs.values()))
+
+    async def delete_many(self, query):
+        if '_id' in query:
+            doomed = [k for k, d in self.docs.items() if d['_id'] in query['_id']['$in']]
+        else:
+            doomed = [k for k, d in self.docs.items() if all(d.get(f) == v for f, v in query.items())]
+        for key in doomed:
+            del self.docs[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+
+def media(file_id):
+    return SimpleNamespace(file_id=file_id, file_unique_id=file_id + "u", file_size=1)
+
+
+class FileCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.col = FakeCollection()
+        self.cache = FileCache(SimpleNamespace(db=SimpleNamespace(file_ids=self.col)), max_entries=2)
+
+    def test_key_uses_the_normalized_url(self):
+        self.assertEqual(
+            FileCache.make_key("https://youtu.be/dQw4w9WgXcQ", "22", "video"),
+            FileCache.make_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=x", "22", "video"),
+        )
+        self.assertNotEqual(
+            FileCache.make_key("https://a.com/v", "22", "video"),
+            FileCache.make_key("https://a.com/v", "22", "document"),
+        )
+
+    async def test_put_then_get(self):
+        await self.cache.put("https://a.com/v", "22", "video", media("F1"), caption="c")
+        doc = await self.cache.get("https://www.a.com/v", "22", "video")
+        self.assertEqual((doc['file_id'], doc['caption']), ("F1", "c"))
+        self.assertIsNone(await self.cache.get("https://a.com/v", "18", "video"))
+
+    async def test_least_recently_used_entries_are_evicted(self):
+        await self.cache.put("https://a.com/1", "22", "video", media("F1"))
+        await self.cache.put("https://a.com/2", "22", "video", media("F2"))
+        # Touch 1 so 2 becomes the oldest
+        await self.cache.get("https://a.com/1", "22", "video")
+        await self.cache.put("https://a.com/3", "22", "video", media("F3"))
+        self.assertIsNotNone(await self.cache.get("https://a.com/1", "22", "video"))
+        self.assertIsNone(await self.cache.get("https://a.com/2", "22", "video"))
+
+    async def test_invalidate_every_format_of_a_url(self):
+        await self.cache.put("https://a.com/1", "22", "video", media("F1"))
+        await self.cache.put("https://a.com/1", "18", "video", media("F2"))
+        self.assertEqual(await self.cache.invalidate("https://a.com/1"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
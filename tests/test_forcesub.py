@@ -0,0 +1,46 @@
+import time
+import unittest
+from unittest import mock
+
+from plugins.functions import forcesub
+from plugins.functions.forcesub import ForceSubCache
+
+
+class ForceSubCacheTest(unittest.TestCase):
+    def test_members_expire(self):
+        cache = ForceSubCache(member_ttl=60, link_ttl=60)
+        cache.add(1)
+        self.assertTrue(cache.is_member(1))
+        with mock.patch.object(forcesub.time, "monotonic", return_value=time.monotonic() + 61):
+            self.assertFalse(cache.is_member(1))
+        self.assertFalse(cache.is_member(1))
+
+    def test_cache_stays_under_the_cap(self):
+        cache = ForceSubCache(member_ttl=3600, link_ttl=60)
+        with mock.patch.object(forcesub, "MEMBERS_MAX", 3):
+            for user_id in range(10):
+                cache.add(user_id)
+            self.assertEqual(cache.stats()["members"], 3)
+            # The oldest go first
+            self.assertFalse(cache.is_member(0))
+            self.assertTrue(cache.is_member(9))
+
+    def test_readding_refreshes_the_entry(self):
+        cache = ForceSubCache(member_ttl=3600, link_ttl=60)
+        with mock.patch.object(forcesub, "MEMBERS_MAX", 2):
+            cache.add(1)
+            cache.add(2)
+            cache.add(1)
+            cache.add(3)
+            self.assertTrue(cache.is_member(1))
+            self.assertFalse(cache.is_member(2))
+
+    def test_drop(self):
+        cache = ForceSubCache(member_ttl=60, link_ttl=60)
+        cache.add(1)
+        cache.drop(1)
+        self.assertFalse(cache.is_member(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+
+from plugins.config import Config
+from plugins.functions import hedge
+
+
+class FakePool:
+    """Extracts by sleeping args[0] seconds; records cancellations."""
+
+    def __init__(self):
+        self.cancelled = []
+
+    async def extract(self, args, url, job_id=None):
+        delay, info = args
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(delay)
+            raise
+        return info
+
+
+class HedgeTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = FakePool()
+        self._pool, hedge.extract_pool = hedge.extract_pool, self.pool
+        self._delay, Config.HEDGE_DELAY = Config.HEDGE_DELAY, 0
+        hedge.HEDGE_STATS.clear()
+        hedge.LEARNED_DOMAINS.clear()
+
+    def tearDown(self):
+        hedge.extract_pool = self._pool
+        Config.HEDGE_DELAY = self._delay
+
+    async def test_loser_is_cancelled_once_a_winner_returns(self):
+        info = await hedge.hedged_extract("https://www.a.com/v", [0.01, {"url": "p"}], [5, {"url": "f"}])
+        await asyncio.sleep(0)
+        self.assertEqual(info, {"url": "p"})
+        self.assertEqual(self.pool.cancelled, [5])
+        self.assertEqual(hedge.HEDGE_STATS["a.com"]["primary"], 1)
+
+    async def test_fallback_win_is_learned(self):
+        info = await hedge.hedged_extract("https://b.com/v", [0.01, {}], [0.02, {"formats": [1]}])
+        self.assertEqual(info, {"formats": [1]})
+        self.assertTrue(hedge.needs_fallback("b.com"))
+
+    async def test_both_failing_raises(self):
+        with self.assertRaises(RuntimeError):
+            await hedge.hedged_extract("https://c.com/v", [0.01, None], [0.01, {}])
+        self.assertEqual(hedge.HEDGE_STATS["c.com"]["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
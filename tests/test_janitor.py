@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from plugins.functions.janitor import SNAPSHOT_GRACE, Janitor
+
+
+def make(path, size, age):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    t = time.time() - age
+    os.utime(path, (t, t))
+    os.utime(os.path.dirname(path), (t, t))
+
+
+class JanitorSweepTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def sweep(self, max_age, max_bytes, protected=(), users=()):
+        janitor = Janitor(self.root, 60, max_age, max_bytes)
+        self.addCleanup(janitor._executor.shutdown)
+        return janitor._sweep({os.path.join(self.root, p) for p in protected}, set(users), time.time())
+
+    def test_expired_entries_go(self):
+        make(os.path.join(self.root, "old", "v.mp4"), 100, 7200)
+        make(os.path.join(self.root, "new", "v.mp4"), 100, 600)
+        self.assertEqual(self.sweep(3600, 0), (100, 1))
+        self.assertEqual(os.listdir(self.root), ["new"])
+
+    def test_quota_removes_oldest_first(self):
+        make(os.path.join(self.root, "a", "v.mp4"), 400, 3000)
+        make(os.path.join(self.root, "b", "v.mp4"), 400, 2000)
+        make(os.path.join(self.root, "c", "v.mp4"), 400, 1000)
+        self.assertEqual(self.sweep(3600, 900), (400, 1))
+        self.assertEqual(sorted(os.listdir(self.root)), ["b", "c"])
+
+    def test_entries_newer_than_the_snapshot_are_kept(self):
+        # A job that started after the protected paths were taken
+        make(os.path.join(self.root, "job", "v.mp4"), 1000, SNAPSHOT_GRACE / 2)
+        make(os.path.join(self.root, "old", "v.mp4"), 10, 1000)
+        self.assertEqual(self.sweep(3600, 100), (10, 1))
+        self.assertEqual(os.listdir(self.root), ["job"])
+
+    def test_running_jobs_are_left_alone(self):
+        make(os.path.join(self.root, "tmp", "v.mp4"), 100, 7200)
+        make(os.path.join(self.root, "1234", "v.mp4"), 100, 7200)
+        self.assertEqual(self.sweep(3600, 0, protected=["tmp"], users=["1234"]), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from plugins.functions.metadata import MetadataService, moov_position, parse_ffprobe
+
+
+def box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+class ParseFfprobeTest(unittest.TestCase):
+    def test_video_and_audio(self):
+        meta = parse_ffprobe(json.dumps({
+            "format": {"duration": "61.5"},
+            "streams": [
+                {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+                {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080},
+                {"codec_type": "audio", "codec_name": "aac"},
+            ],
+        }))
+        self.assertEqual(
+            (meta["width"], meta["height"], meta["duration"], meta["vcodec"], meta["acodec"]),
+            (1920, 1080, 61, "h264", "aac"),
+        )
+
+    def test_rotated_video_is_portrait(self):
+        meta = parse_ffprobe(json.dumps({"streams": [{
+            "codec_type": "video", "width": 1920, "height": 1080, "duration": "3",
+            "side_data_list": [{"rotation": -90}],
+        }]}))
+        self.assertEqual((meta["width"], meta["height"], meta["duration"]), (1080, 1920, 3))
+
+    def test_empty_output(self):
+        self.assertEqual(parse_ffprobe("{}")["duration"], 0)
+
+
+class MoovPositionTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def write(self, data):
+        path = os.path.join(self.root, "f.mp4")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_faststart(self):
+        path = self.write(box(b"ftyp", b"isom") + box(b"moov") + box(b"mdat", b"\0" * 16))
+        self.assertEqual(moov_position(path), (12, True))
+
+    def test_moov_at_the_end(self):
+        path = self.write(box(b"ftyp", b"isom") + box(b"mdat", b"\0" * 16) + box(b"moov"))
+        self.assertEqual(moov_position(path), (36, False))
+
+    def test_not_mp4(self):
+        self.assertEqual(moov_position(self.write(b"\x1aE\xdf\xa3" + b"\0" * 32)), (None, None))
+
+
+class MetadataServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def test_known_values_skip_probing(self):
+        service = MetadataService(workers=1, max_entries=4)
+        meta = await service.probe("/does/not/exist", known={"width": 640, "height": 360, "duration": 9.7})
+        self.assertEqual((meta["width"], meta["height"], meta["duration"]), (640, 360, 9))
+        self.assertEqual(service.stats()["skipped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from plugins.functions import progress
+from plugins.functions.progress import ProgressEvent, publish, subscribe
+
+
+class ProgressEventTest(unittest.TestCase):
+    def test_from_hook(self):
+        event = ProgressEvent.from_hook("j", {
+            "status": "downloading", "downloaded_bytes": 50, "total_bytes_estimate": 200,
+            "speed": 10.0, "eta": 15, "filename": "f.mp4",
+        })
+        self.assertEqual((event.downloaded, event.total, event.eta), (50, 200, 15))
+        self.assertEqual(event.percent, 25.0)
+
+    def test_percent_from_fragments(self):
+        event = ProgressEvent("j", "downloading", fragment_index=3, fragment_count=12)
+        self.assertEqual(event.percent, 25.0)
+        self.assertIsNone(ProgressEvent("j", "downloading", downloaded=5).percent)
+
+
+class PublishTest(unittest.TestCase):
+    def tearDown(self):
+        progress._subscribers.clear()
+
+    def test_subscribers_get_their_job_and_wildcards_get_all(self):
+        mine, everything = [], []
+        unsubscribe = subscribe(mine.append, "a")
+        subscribe(everything.append)
+        publish(ProgressEvent("a", "downloading"))
+        publish(ProgressEvent("b", "finished"))
+        self.assertEqual([e.job_id for e in mine], ["a"])
+        self.assertEqual([e.job_id for e in everything], ["a", "b"])
+        unsubscribe()
+        publish(ProgressEvent("a", "finished"))
+        self.assertEqual(len(mine), 1)
+        self.assertNotIn("a", progress._subscribers)
+
+    def test_a_failing_subscriber_does_not_stop_the_rest(self):
+        seen = []
+
+        def broken(event):
+            raise ValueError("boom")
+
+        subscribe(broken, "a")
+        subscribe(seen.append, "a")
+        with self.assertLogs(progress.logger, "WARNING"):
+            publish(ProgressEvent("a", "downloading"))
+        self.assertEqual(len(seen), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.functions.redirects import RedirectResolver, final_location
+
+# Stands in for curl-impersonate-chrome; the URL ($5) picks the outcome
+FAKE_CURL = """#!/bin/sh
+case "$5" in
+  *timeout*) printf 'HTTP/1.1 302\\r\\nLocation: https://partial/\\r\\n'; exit 28;;
+  *dns*) exit 6;;
+  *) printf 'HTTP/1.1 302\\r\\nLocation: https://a/1\\r\\n\\r\\nHTTP/1.1 302\\r\\nlocation: https://cdn/final\\r\\n\\r\\nHTTP/1.1 200\\r\\n';;
+esac
+"""
+
+
+class FinalLocationTest(unittest.TestCase):
+    def test_last_location_wins(self):
+        headers = "HTTP/1.1 302\r\nLocation: https://a/1\r\n\r\nHTTP/1.1 301\r\nlocation: https://b/2\r\n"
+        self.assertEqual(final_location(headers, "https://x/"), "https://b/2")
+
+    def test_no_redirect(self):
+        self.assertEqual(final_location("HTTP/1.1 200\r\n", "https://x/"), "https://x/")
+
+
+@unittest.skipIf(os.name != "posix", "fake curl is a shell script")
+class RedirectResolverTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        bin_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, bin_dir, True)
+        curl = os.path.join(bin_dir, "curl-impersonate-chrome")
+        with open(curl, "w") as f:
+            f.write(FAKE_CURL)
+        os.chmod(curl, 0o755)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = bin_dir + os.pathsep + path
+        self.addCleanup(os.environ.__setitem__, "PATH", path)
+        self.resolver = RedirectResolver(timeout=5, concurrency=2, ttl=60)
+
+    async def test_resolves_and_caches(self):
+        self.assertEqual(await self.resolver.resolve("https://ok/"), "https://cdn/final")
+        self.assertEqual(await self.resolver.resolve("https://ok/"), "https://cdn/final")
+        stats = self.resolver.stats()
+        self.assertEqual((stats["resolved"], stats["hits"]), (1, 1))
+
+    async def test_curl_timeout_is_not_cached(self):
+        self.assertEqual(await self.resolver.resolve("https://timeout/"), "https://timeout/")
+        await self.resolver.resolve("https://timeout/")
+        stats = self.resolver.stats()
+        self.assertEqual((stats["timeouts"], stats["resolved"], stats["hits"]), (2, 0, 0))
+
+    async def test_curl_failure_is_not_cached(self):
+        self.assertEqual(await self.resolver.resolve("https://dns/"), "https://dns/")
+        stats = self.resolver.stats()
+        self.assertEqual((stats["failed"], stats["resolved"]), (1, 0))
+        self.assertNotIn("https://dns/", self.resolver._cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
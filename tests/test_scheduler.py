@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+
+from plugins.functions.scheduler import JobScheduler
+
+
+class JobSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_users_take_turns(self):
+        scheduler = JobScheduler(network_limit=1, upload_limit=1)
+        order = []
+
+        def work(label):
+            async def func(job):
+                order.append(label)
+                await asyncio.sleep(0.01)
+            return func
+
+        jobs = [scheduler.submit("a", work(f"a{i}")) for i in range(3)]
+        jobs.append(scheduler.submit("b", work("b0")))
+        self.assertEqual(scheduler.position(jobs[3]), 1)
+        await asyncio.gather(*(j.task for j in jobs[:1]))
+        while scheduler.stats()["finished"] < 4:
+            await asyncio.sleep(0.01)
+        self.assertEqual(order, ["a0", "b0", "a1", "a2"])
+
+    async def test_network_limit(self):
+        scheduler = JobScheduler(network_limit=2, upload_limit=1)
+        release = asyncio.Event()
+
+        async def func(job):
+            await release.wait()
+
+        for user in "abc":
+            scheduler.submit(user, func)
+        await asyncio.sleep(0)
+        self.assertEqual((scheduler.stats()["downloading"], scheduler.stats()["queued"]), (2, 1))
+        release.set()
+        while scheduler.stats()["finished"] < 3:
+            await asyncio.sleep(0.01)
+
+    async def test_upload_stage_frees_the_network_slot(self):
+        scheduler = JobScheduler(network_limit=1, upload_limit=1)
+        uploading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def func(job):
+            async with scheduler.upload_slot(job):
+                uploading.set()
+                await release.wait()
+
+        first = scheduler.submit("a", func)
+        second = scheduler.submit("b", func)
+        await uploading.wait()
+        await asyncio.sleep(0)
+        self.assertEqual(first.state, "upload")
+        self.assertEqual(second.state, "waiting_upload")
+        release.set()
+        await asyncio.gather(first.task, second.task)
+
+    async def test_cancel_queued_job(self):
+        scheduler = JobScheduler(network_limit=1, upload_limit=1)
+        release = asyncio.Event()
+
+        async def func(job):
+            await release.wait()
+
+        running = scheduler.submit("a", func)
+        queued = scheduler.submit("b", func)
+        self.assertTrue(scheduler.cancel(queued.id))
+        self.assertIsNone(queued.task)
+        self.assertEqual(scheduler.stats()["queued"], 0)
+        self.assertFalse(scheduler.cancel(queued.id))
+        release.set()
+        await running.task
+        self.assertEqual(scheduler.stats()["cancelled"], 1)
+
+    async def test_cancel_running_job_frees_its_slot(self):
+        scheduler = JobScheduler(network_limit=1, upload_limit=1)
+        started = []
+
+        async def func(job):
+            started.append(job.id)
+            await asyncio.sleep(60)
+
+        running = scheduler.submit("a", func)
+        waiting = scheduler.submit("b", func)
+        await asyncio.sleep(0)
+        scheduler.cancel(running.id)
+        await asyncio.sleep(0.01)
+        self.assertEqual(started, [running.id, waiting.id])
+        self.assertEqual(scheduler.stats()["cancelled"], 1)
+        scheduler.cancel(waiting.id)
+        await asyncio.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from plugins.functions.sessions import SessionStore, compact_info
+
+INFO = {
+    "title": "t",
+    "duration": 10,
+    "webpage_url": "https://a.com/v",
+    "extractor_key": "Generic",
+    "http_headers": {"User-Agent": "x"},
+    "formats": [
+        {"format_id": "137", "acodec": "none", "url": "u1", "fragments": [1, 2, 3]},
+        {"format_id": "140", "vcodec": "none", "url": "u2"},
+        {"format_id": "18", "url": "u3"},
+    ],
+}
+
+
+class CompactInfoTest(unittest.TestCase):
+    def test_keeps_only_offered_formats_and_their_merge_parts(self):
+        session = compact_info(INFO, ["137+140"])
+        self.assertEqual([f["format_id"] for f in session["formats"]], ["137", "140"])
+        self.assertNotIn("fragments", session["formats"][0])
+        self.assertNotIn("http_headers", session)
+        self.assertEqual((session["title"], session["extractor"]), ("t", "Generic"))
+
+
+class SessionStoreTest(unittest.IsolatedAsyncioTestCase):
+    async def test_create_get_drop(self):
+        store = SessionStore(ttl=60)
+        sess_id = await store.create(1, INFO, ["18"])
+        self.assertEqual((await store.get(1, sess_id))["title"], "t")
+        self.assertIsNone(await store.get(2, sess_id))
+        await store.drop(1, sess_id)
+        self.assertIsNone(await store.get(1, sess_id))
+
+    async def test_expired_sessions_are_gone(self):
+        store = SessionStore(ttl=0)
+        sess_id = await store.create(1, INFO, ["18"])
+        self.assertIsNone(await store.get(1, sess_id))
+
+    async def test_persisted_sessions_survive_a_restart(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        sess_id = await SessionStore(60, root).create(1, INFO, ["18"])
+        self.assertEqual(len(os.listdir(root)), 1)
+        store = SessionStore(60, root)
+        self.assertEqual((await store.get(1, sess_id))["formats"][0]["format_id"], "18")
+
+
+if __name__ == "__main__":
+    unittest.main()
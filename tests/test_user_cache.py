@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from plugins.database import database
+from plugins.database.database import UserCache
+
+
+class UserCacheTest(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = UserCache(max_entries=10, ttl=60)
+        self.assertIsNone(cache.get(1))
+        cache.put(1, {'id': 1})
+        self.assertEqual(cache.get(1), {'id': 1})
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_entries_expire(self):
+        cache = UserCache(max_entries=10, ttl=60)
+        with mock.patch.object(database.time, "time", return_value=1000):
+            cache.put(1, {'id': 1})
+        with mock.patch.object(database.time, "time", return_value=1061):
+            self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_goes_first(self):
+        cache = UserCache(max_entries=2, ttl=60)
+        cache.put(1, {'id': 1})
+        cache.put(2, {'id': 2})
+        cache.get(1)
+        cache.put(3, {'id': 3})
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNotNone(cache.get(3))
+
+    def test_update_writes_through(self):
+        cache = UserCache(max_entries=10, ttl=60)
+        cache.put(1, {'id': 1, 'caption': None})
+        cache.update(1, 'caption', 'hi')
+        cache.update(2, 'caption', 'ignored')
+        self.assertEqual(cache.get(1)['caption'], 'hi')
+        self.assertIsNone(cache.get(2))
+        cache.drop(1)
+        self.assertIsNone(cache.get(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
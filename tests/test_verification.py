@@ -0,0 +1,69 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+
+from plugins.database.verification import VerificationStore, next_midnight
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.finds = 0
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def find_one(self, query):
+        self.finds += 1
+        doc = self.docs.get(query['_id'])
+        if doc is not None and all(doc.get(k) == v for k, v in query.items() if k != '_id'):
+            return doc
+        return None
+
+    async def insert_one(self, doc):
+        self.docs[doc['_id']] = dict(doc)
+
+    async def delete_many(self, query):
+        for key in [k for k, d in self.docs.items() if d.get('user_id') == query['user_id']]:
+            del self.docs[key]
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query['_id'])
+        if doc is None and upsert:
+            doc = self.docs[query['_id']] = {'_id': query['_id']}
+        if doc is not None:
+            doc.update(update['$set'])
+
+
+class VerificationStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store = VerificationStore(
+            SimpleNamespace(db=SimpleNamespace(verify_tokens=FakeCollection(), verified_users=FakeCollection())),
+            token_ttl=60,
+        )
+
+    def test_next_midnight_is_within_a_day(self):
+        left = next_midnight() - datetime.datetime.now(datetime.timezone.utc)
+        self.assertTrue(datetime.timedelta(0) < left <= datetime.timedelta(days=1, hours=1))
+
+    async def test_token_lifecycle(self):
+        await self.store.new_token(1, "old")
+        await self.store.new_token(1, "tok")
+        self.assertFalse(await self.store.token_valid(1, "old"))
+        self.assertFalse(await self.store.token_valid(2, "tok"))
+        self.assertTrue(await self.store.token_valid(1, "tok"))
+        await self.store.mark_verified(1, "tok")
+        self.assertFalse(await self.store.token_valid(1, "tok"))
+
+    async def test_verified_users_are_cached(self):
+        self.assertFalse(await self.store.is_verified(1))
+        await self.store.new_token(1, "tok")
+        await self.store.mark_verified(1, "tok")
+        finds = self.store.verified.finds
+        for _ in range(3):
+            self.assertTrue(await self.store.is_verified(1))
+        self.assertEqual(self.store.verified.finds, finds)
+
+
+if __name__ == "__main__":
+    unittest.main()